@@ -0,0 +1,247 @@
+"""
+Reproducible benchmarks of the workflows used in the TiGL python examples, run on the CPACS configurations in the
+cpacs directory of this repository. The results are written as json and can be compared to a previous run:
+
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --baseline results.json --threshold 0.2
+
+The comparison fails (exit code 1), if the median time of any benchmark increased by more than the threshold or if a
+benchmark of the baseline is missing in the current run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import tigl3.configuration
+import tigl3.curve_factories
+import tigl3.surface_factories
+import tigl3.tigl3wrapper
+import tixi3.tixi3wrapper
+
+here = os.path.dirname(os.path.abspath(__file__))
+cpacs_dir = os.path.join(here, "..", "..", "..", "cpacs")
+sys.path.insert(0, os.path.join(here, "..", "cpacscreator-animation"))
+sys.path.insert(0, os.path.join(here, "..", "geometry-modeling"))
+
+cpacs_files = ["simpletest.cpacs.xml", "CPACS_30_D150.xml", "concorde.cpacs3.xml", "ariane.xml"]
+
+
+def open_configuration(filename):
+    """
+    :return: the tixi handle, the tigl handle and the aircraft configuration of a cpacs file
+    """
+    tixi_h = tixi3.tixi3wrapper.Tixi3()
+    tixi_h.open(filename)
+    tigl_h = tigl3.tigl3wrapper.Tigl3()
+    tigl_h.open(tixi_h, "")
+    mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+    return tixi_h, tigl_h, mgr.get_configuration(tigl_h._handle.value)
+
+
+def close_configuration(tixi_h, tigl_h):
+    tigl_h.close()
+    tixi_h.close()
+
+
+def components(aircraft):
+    """
+    :return: a list of all wings and fuselages of a configuration
+    """
+    result = [aircraft.get_fuselage(i) for i in range(1, aircraft.get_fuselage_count() + 1)]
+    result += [aircraft.get_wing(i) for i in range(1, aircraft.get_wing_count() + 1)]
+    return result
+
+
+def timed(func):
+    """
+    :return: the wall clock time of a single call of func in seconds
+    """
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_open(filename, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        handles = open_configuration(filename)
+        times.append(time.perf_counter() - start)
+        close_configuration(*handles[:2])
+    return {"open": times}
+
+
+def bench_get_loft(filename, repeat):
+    # TiGL caches the lofts, hence each repetition opens the configuration again
+    results = {}
+    for i in range(repeat):
+        tixi_h, tigl_h, aircraft = open_configuration(filename)
+        for component in components(aircraft):
+            key = "get_loft/" + component.get_uid()
+            results.setdefault(key, []).append(timed(component.get_loft))
+        close_configuration(tixi_h, tigl_h)
+    return results
+
+
+def bench_export(filename, repeat):
+    results = {"export_iges": [], "export_step": []}
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for i in range(repeat):
+            tixi_h, tigl_h, aircraft = open_configuration(filename)
+            # build the lofts before, so that only the export is measured
+            for component in components(aircraft):
+                component.get_loft()
+            results["export_iges"].append(timed(lambda: tigl_h.exportIGES(os.path.join(tmp_dir, "out.igs"))))
+            results["export_step"].append(timed(lambda: tigl_h.exportSTEP(os.path.join(tmp_dir, "out.stp"))))
+            close_configuration(tixi_h, tigl_h)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def bench_surface_modeling(repeat):
+    from geometry_modeling import SurfaceModelingDemo
+
+    demo = SurfaceModelingDemo()
+    profiles = [demo.curve1, demo.curve2, demo.curve3]
+    guides = [demo.te_up, demo.le, demo.te_lo]
+
+    results = {"interpolate_points": [], "interpolate_curves": [], "interpolate_curve_network": []}
+    for i in range(repeat):
+        results["interpolate_points"].append(
+            timed(lambda: tigl3.curve_factories.interpolate_points(demo.points_c1)))
+        results["interpolate_curves"].append(
+            timed(lambda: tigl3.surface_factories.interpolate_curves(profiles)))
+        results["interpolate_curve_network"].append(
+            timed(lambda: tigl3.surface_factories.interpolate_curve_network(profiles, guides)))
+    return results
+
+
+def bench_modify_parameters(repeat):
+    import bounding_boxes
+    import create_airplane
+
+    filename = os.path.join(here, "..", "cpacscreator-animation", "empty.cpacs3.xml")
+    tixi_h, tigl_h, aircraft = create_airplane.open_aircraft(filename)
+    for lofts in create_airplane.animation_frames(aircraft, 0, 0, bbox_cache=bounding_boxes.BoundingBoxCache(aircraft)):
+        pass
+    aircraft.write_cpacs(aircraft.get_uid())
+    base_document = tixi_h.exportDocumentAsString()
+    close_configuration(tixi_h, tigl_h)
+
+    # some parameters are applied relative to the current state (e.g. the scaling of the main wing), hence each
+    # repetition applies the final parameters to a fresh copy of the generated airplane
+    times = []
+    for i in range(repeat):
+        tixi_h = tixi3.tixi3wrapper.Tixi3()
+        tixi_h.openString(base_document)
+        tigl_h = tigl3.tigl3wrapper.Tigl3()
+        tigl_h.open(tixi_h, "")
+        mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+        aircraft = mgr.get_configuration(tigl_h._handle.value)
+        times.append(timed(lambda: create_airplane.modify_parameters(aircraft,
+                                                                     create_airplane.smooth_parameters_final)))
+        close_configuration(tixi_h, tigl_h)
+    return {"modify_parameters": times}
+
+
+def summarize(times):
+    times = np.asarray(times)
+    return {
+        "median": float(np.median(times)),
+        "min": float(np.min(times)),
+        "max": float(np.max(times)),
+        "repeat": len(times)
+    }
+
+
+def run_benchmarks(repeat):
+    """
+    runs all benchmarks
+    :param repeat: how often each measurement is repeated
+    :return: a dictionary mapping the benchmark name to its timing summary
+    """
+    results = {}
+
+    for cpacs_file in cpacs_files:
+        filename = os.path.join(cpacs_dir, cpacs_file)
+        for bench in [bench_open, bench_get_loft, bench_export]:
+            try:
+                times = bench(filename, repeat)
+            except Exception as e:
+                print("Skipping %s on %s: %s" % (bench.__name__, cpacs_file, e))
+                continue
+            for name, t in times.items():
+                results[cpacs_file + "/" + name] = summarize(t)
+
+    for name, t in bench_surface_modeling(repeat).items():
+        results["surface_modeling/" + name] = summarize(t)
+
+    for name, t in bench_modify_parameters(repeat).items():
+        results["cpacscreator_animation/" + name] = summarize(t)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    compares the median times of two runs
+    :param threshold: the allowed relative increase of the median time, e.g. 0.2 for 20%
+    :return: a list of the names of all benchmarks that regressed or are missing in the current run
+    """
+    regressions = []
+    print("%-60s %12s %12s %8s" % ("benchmark", "baseline [s]", "current [s]", "change"))
+    for name in sorted(set(baseline) - set(results)):
+        # e.g. the benchmark failed and was skipped
+        regressions.append(name)
+        print("%-60s %12.6f %12s %8s MISSING" % (name, baseline[name]["median"], "-", "-"))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]["median"]
+        new = results[name]["median"]
+        change = (new - old) / old if old > 0 else 0.
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print("%-60s %12.6f %12.6f %+7.1f%%%s" % (name, old, new, 100 * change, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the TiGL python examples")
+    parser.add_argument("--output", default="benchmark.json", help="json file the results are written to")
+    parser.add_argument("--repeat", type=int, default=5, help="how often each measurement is repeated")
+    parser.add_argument("--baseline", default=None, help="json file of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative increase of the median time compared to the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": sys.version,
+                "platform": platform.platform(),
+                "repeat": args.repeat
+            },
+            "results": results
+        }, f, indent=4, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,258 @@
+"""
+A lightweight index of all uIDs of a CPACS file. The file is scanned once and the XPath and byte range of each
+element with a uID are stored in a sidecar file next to it (<file>.uidindex.json). Afterwards, components can be
+listed and single elements extracted without parsing the whole file:
+
+    index = CPACSIndex.load("../../../cpacs/CPACS_30_D150.xml")
+    index.components()                       # [("D150_VAMP_FL1", "fuselage"), ("D150_VAMP_W1", "wing"), ...]
+    index.xpath("D150_VAMP_W1")              # "/cpacs/vehicles/aircraft/model/wings/wing[1]"
+    index.extract("D150_VAMP_W1")            # the xml of the wing as bytes
+
+reduced_document creates a copy of the file containing only some of the geometric components, so that TiGL only
+builds the components that are actually needed.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# geometric components of the model, which can be removed by CPACSIndex.reduced_document
+component_tags = ["fuselage", "wing", "engine", "enginePylon", "rotor", "genericGeometryComponent"]
+
+# profiles containing a point list
+profile_tags = ["fuselageProfile", "wingAirfoil", "rotorAirfoil", "nacelleProfile"]
+
+# comments, processing instructions, CDATA sections, end tags and start tags of an xml file
+_token = re.compile(br'<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>|<!DOCTYPE[^>]*>'
+                    br'|</([^\s>]+)\s*>'
+                    br'|<([^\s/>!?]+)((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>', re.DOTALL)
+_uid = re.compile(br'\buID\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+class _Element(object):
+    __slots__ = ["name", "path", "counts", "uid", "content_start"]
+
+    def __init__(self, name, path, uid, content_start):
+        self.name = name
+        self.path = path
+        # number of children per tag
+        self.counts = {}
+        self.uid = uid
+        self.content_start = content_start
+
+
+def _format_xpath(path):
+    # the position is only added, if the parent has several children of the same name
+    return "".join("/%s[%d]" % (name, i) if counts[name] > 1 else "/" + name for name, i, counts in path)
+
+
+def build_index(filename):
+    """
+    scans a CPACS file for elements with a uID
+    :return: a dictionary mapping each uID to a dictionary containing the tag, the xpath, the byte range
+             (start, end) of the element, the uID of the closest ancestor with a uID (parent) and, for geometric
+             components, the content of their parentUID element (parent_uid)
+    """
+    entries = {}
+    stack = []
+    root_counts = {}
+    paths = {}
+
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return entries
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for m in _token.finditer(data):
+                end_tag, tag, attributes, self_closing = m.groups()
+                if end_tag is not None:
+                    element = stack.pop()
+                    if element.uid is not None:
+                        entries[element.uid]["end"] = m.end()
+                    elif element.name == "parentUID" and stack and stack[-1].uid is not None:
+                        entries[stack[-1].uid]["parent_uid"] = \
+                            data[element.content_start:m.start()].decode("utf-8").strip()
+                    continue
+                if tag is None:
+                    continue
+
+                name = tag.decode("utf-8")
+                counts = stack[-1].counts if stack else root_counts
+                counts[name] = counts.get(name, 0) + 1
+                path = (stack[-1].path if stack else ()) + ((name, counts[name], counts),)
+
+                uid = None
+                uid_match = _uid.search(attributes)
+                if uid_match is not None:
+                    uid = (uid_match.group(1) or uid_match.group(2) or b"").decode("utf-8")
+                    if uid in entries:
+                        # uIDs must be unique, the first occurrence wins
+                        uid = None
+                if uid is not None:
+                    parents = [e.uid for e in stack if e.uid is not None]
+                    entries[uid] = {"tag": name, "start": m.start(), "end": m.end(),
+                                    "parent": parents[-1] if parents else None}
+                    paths[uid] = path
+
+                if not self_closing:
+                    stack.append(_Element(name, path, uid, m.end()))
+        finally:
+            data.close()
+
+    # the xpaths are formatted at the end, as the number of siblings is known only then
+    for uid, path in paths.items():
+        entries[uid]["xpath"] = _format_xpath(path)
+    return entries
+
+
+class CPACSIndex(object):
+    """
+    The uID index of a CPACS file, see build_index
+    """
+
+    def __init__(self, filename, entries):
+        self.filename = filename
+        self.entries = entries
+
+    @staticmethod
+    def sidecar_file(filename):
+        return filename + ".uidindex.json"
+
+    @classmethod
+    def load(cls, filename, write_sidecar=True):
+        """
+        loads the index of a CPACS file from its sidecar file. If there is none or the CPACS file changed since,
+        the index is built again
+        :param write_sidecar: if True, a rebuilt index is stored in the sidecar file
+        """
+        stat = os.stat(filename)
+        sidecar = cls.sidecar_file(filename)
+        if os.path.isfile(sidecar):
+            with open(sidecar, "r") as f:
+                content = json.load(f)
+            if content["mtime"] == stat.st_mtime and content["size"] == stat.st_size:
+                return cls(filename, content["entries"])
+
+        index = cls(filename, build_index(filename))
+        if write_sidecar:
+            with open(sidecar, "w") as f:
+                json.dump({"mtime": stat.st_mtime, "size": stat.st_size, "entries": index.entries}, f)
+        return index
+
+    def __contains__(self, uid):
+        return uid in self.entries
+
+    def uids(self):
+        """
+        :return: all uIDs in document order
+        """
+        return sorted(self.entries, key=lambda uid: self.entries[uid]["start"])
+
+    def components(self, tags=None):
+        """
+        :param tags: the tags of the listed elements. Defaults to the geometric components
+        :return: a list of (uid, tag) in document order
+        """
+        tags = component_tags if tags is None else tags
+        return [(uid, self.entries[uid]["tag"]) for uid in self.uids() if self.entries[uid]["tag"] in tags]
+
+    def profiles(self):
+        """
+        :return: a list of (uid, tag) of all profiles in document order
+        """
+        return self.components(profile_tags)
+
+    def xpath(self, uid):
+        return self.entries[uid]["xpath"]
+
+    def extract(self, uid):
+        """
+        :return: the xml of an element and all its children as bytes
+        """
+        entry = self.entries[uid]
+        with open(self.filename, "rb") as f:
+            f.seek(entry["start"])
+            return f.read(entry["end"] - entry["start"])
+
+    def element(self, uid):
+        """
+        :return: the element with the uid as xml.etree.ElementTree.Element
+        """
+        # the xsi namespace is declared by the root element of the file
+        wrapped = b'<wrapper xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">%s</wrapper>' % self.extract(uid)
+        return ET.fromstring(wrapped)[0]
+
+    def profile_points(self, uid):
+        """
+        :return: the point list of a profile as array of shape (n, 3)
+        """
+        point_list = self.element(uid).find("pointList")
+        if point_list is None:
+            raise ValueError("'%s' has no point list" % uid)
+        return np.column_stack([np.fromstring(point_list.find(c).text.strip().strip(";"), sep=";")
+                                for c in "xyz"])
+
+    def _is_model_component(self, uid):
+        entry = self.entries[uid]
+        return entry["tag"] in component_tags and "/model" in entry["xpath"]
+
+    def reduced_document(self, uids):
+        """
+        creates a copy of the CPACS file, which only contains the requested geometric components of the model,
+        the components they are attached to (parentUID) and everything else that is not a geometric component
+        (e.g. profiles)
+        :param uids: the uids of the requested components
+        :return: the reduced document as bytes, which can be opened with tixi_h.openString
+        """
+        keep = set()
+        todo = list(uids)
+        while todo:
+            uid = todo.pop()
+            if uid in keep:
+                continue
+            if uid not in self.entries:
+                raise KeyError("Unknown uID '%s'" % uid)
+            keep.add(uid)
+            parent = self.entries[uid].get("parent_uid")
+            if parent:
+                todo.append(parent)
+
+        ranges = []
+        for uid in self.uids():
+            entry = self.entries[uid]
+            if not self._is_model_component(uid) or uid in keep:
+                continue
+            # skip components inside of an already removed component
+            if ranges and entry["start"] < ranges[-1][1]:
+                continue
+            ranges.append((entry["start"], entry["end"]))
+
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        parts = []
+        position = 0
+        for start, end in ranges:
+            parts.append(data[position:start])
+            position = end
+        parts.append(data[position:])
+        return b"".join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists and extracts the elements of a CPACS file by their uID")
+    parser.add_argument("filename", help="the CPACS file")
+    parser.add_argument("--profiles", action="store_true", help="list the profiles instead of the components")
+    parser.add_argument("--extract", default=None, help="print the xml of the element with this uID")
+    args = parser.parse_args()
+
+    index = CPACSIndex.load(args.filename)
+    if args.extract is not None:
+        print(index.extract(args.extract).decode("utf-8"))
+    else:
+        for uid, tag in (index.profiles() if args.profiles else index.components()):
+            print("%-25s %-40s %s" % (tag, uid, index.xpath(uid)))
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from OCC.BRepBndLib import brepbndlib_Add
+from OCC.Bnd import Bnd_Box
+
+
+def shape_bounding_box(shape, mode="default"):
+    """
+    computes the axis aligned bounding box of a shape
+    :param shape: a TopoDS_Shape
+    :param mode: "fast" uses the control points of the surfaces, which gives a quick but larger box.
+                 "exact" computes the optimal box from the surfaces.
+                 "default" uses the triangulation of the shape, if there is one, and the control points otherwise.
+    :return: a tuple (xmin, ymin, zmin, xmax, ymax, zmax)
+    """
+    bbox = Bnd_Box()
+    if mode == "fast":
+        brepbndlib_Add(shape, bbox, False)
+    elif mode == "exact":
+        # not available in older versions of pythonocc, which are sufficient for the other modes
+        try:
+            from OCC.BRepBndLib import brepbndlib_AddOptimal
+        except ImportError:
+            raise ImportError("The exact bounding box mode requires brepbndlib_AddOptimal, which is not available in "
+                              "this version of pythonocc")
+        brepbndlib_AddOptimal(shape, bbox, False, False)
+    elif mode == "default":
+        brepbndlib_Add(shape, bbox)
+    else:
+        raise ValueError("Invalid bounding box mode '%s'" % mode)
+    return bbox.Get()
+
+
+class BoundingBoxCache(object):
+    """
+    Computes the bounding boxes of the geometric components of an aircraft. The boxes are cached by the identity of
+    the component's loft. If TiGL rebuilds the loft (e.g. after a parameter changed), the cached box is discarded.
+    """
+
+    def __init__(self, aircraft, mode="default"):
+        """
+        :param aircraft: a tigl handle to the cpacs node of the aircraft
+        :param mode: the default mode of the bounding box computation, see shape_bounding_box
+        """
+        self.aircraft = aircraft
+        self.mode = mode
+        # (uid, mode) -> (shape, bounding box)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _shape(self, uid):
+        component = self.aircraft.get_uidmanager().get_geometric_component(uid)
+        return component.get_loft().shape()
+
+    def _lookup(self, uid, mode, shape):
+        entry = self._entries.get((uid, mode))
+        if entry is not None and entry[0].IsSame(shape):
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def get(self, uid, mode=None):
+        """
+        returns the bounding box of a geometric component
+        :param uid: the uid of the component, e.g. "wing_main"
+        :param mode: the mode of the bounding box computation. If None, the default mode of the cache is used
+        :return: a tuple (xmin, ymin, zmin, xmax, ymax, zmax)
+        """
+        return self.get_all([uid], mode)[uid]
+
+    def get_all(self, uids, mode=None, n_threads=1):
+        """
+        returns the bounding boxes of several geometric components
+        :param uids: a list of component uids
+        :param mode: the mode of the bounding box computation. If None, the default mode of the cache is used
+        :param n_threads: the boxes of the invalidated components are computed by this many threads. Note, that
+                          this only pays off for complex lofts, if the OCC bindings release the GIL.
+        :return: a dictionary mapping each uid to a tuple (xmin, ymin, zmin, xmax, ymax, zmax)
+        """
+        if mode is None:
+            mode = self.mode
+
+        # the lofts are built by TiGL, which has to happen sequentially
+        boxes = {}
+        missing = []
+        for uid in uids:
+            shape = self._shape(uid)
+            bbox = self._lookup(uid, mode, shape)
+            if bbox is None:
+                missing.append((uid, shape))
+            else:
+                boxes[uid] = bbox
+
+        if n_threads > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(n_threads) as executor:
+                results = list(executor.map(lambda entry: shape_bounding_box(entry[1], mode), missing))
+        else:
+            results = [shape_bounding_box(shape, mode) for uid, shape in missing]
+
+        for (uid, shape), bbox in zip(missing, results):
+            self.misses += 1
+            self._entries[(uid, mode)] = (shape, bbox)
+            boxes[uid] = bbox
+
+        return boxes
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,115 @@
+import json
+import os
+
+
+class SnapshotStore(object):
+    """
+    Stores a sequence of cpacs documents, e.g. one for each frame of an animation. Instead of writing the full
+    document for every frame, only the lines that differ from a base document are stored. As long as the topology
+    of the aircraft does not change, the exported documents have the same line structure and only the changed
+    values (positionings, transformations, ...) end up in the delta.
+
+    The directory contains
+     - base_<frame>.xml: the base documents (the first frame and each frame whose structure changed)
+     - deltas.jsonl: one json record per frame containing the frame's base and its changed lines
+    """
+
+    def __init__(self, directory, mode="r", max_changed_fraction=0.5):
+        """
+        :param directory: the directory of the snapshot store
+        :param mode: "w" to create a new store, "r" to read an existing one
+        :param max_changed_fraction: if more than this fraction of the lines changed, the frame is stored as a
+                                     new base document
+        """
+        self.directory = directory
+        self.mode = mode
+        self.max_changed_fraction = max_changed_fraction
+
+        self._bases = {}
+        self._base = None
+        self._offsets = []
+
+        if mode == "w":
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._deltas = open(self._deltas_filename(), "wb")
+        elif mode == "r":
+            self._deltas = open(self._deltas_filename(), "rb")
+            offset = 0
+            for line in self._deltas:
+                self._offsets.append(offset)
+                offset += len(line)
+        else:
+            raise ValueError("Invalid mode '%s'" % mode)
+
+    def _deltas_filename(self):
+        return os.path.join(self.directory, "deltas.jsonl")
+
+    def _base_filename(self, frame):
+        return os.path.join(self.directory, "base_" + str(frame).zfill(4) + ".xml")
+
+    def _base_lines(self, frame):
+        if frame not in self._bases:
+            with open(self._base_filename(frame), "r", newline="") as f:
+                # keep only the most recently used base in memory
+                self._bases = {frame: f.read().splitlines(True)}
+        return self._bases[frame]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add(self, document):
+        """
+        adds a cpacs document as the next frame
+        :param document: the cpacs document as string, e.g. from tixi_h.exportDocumentAsString()
+        :return: the index of the frame
+        """
+        frame = len(self._offsets)
+        lines = document.splitlines(True)
+
+        changed = None
+        if self._base is not None:
+            base_frame, base_lines = self._base
+            if len(lines) == len(base_lines):
+                changed = dict((str(i), line) for i, (base_line, line) in enumerate(zip(base_lines, lines))
+                               if line != base_line)
+                if len(changed) > self.max_changed_fraction * len(lines):
+                    changed = None
+
+        if changed is None:
+            # the structure of the document changed (or too many lines): start a new base
+            with open(self._base_filename(frame), "w", newline="") as f:
+                f.write(document)
+            self._base = (frame, lines)
+            changed = {}
+
+        self._offsets.append(self._deltas.tell())
+        record = json.dumps({"frame": frame, "base": self._base[0], "lines": changed}) + "\n"
+        self._deltas.write(record.encode("utf-8"))
+        return frame
+
+    def get(self, frame):
+        """
+        reconstructs the cpacs document of a frame
+        :param frame: the index of the frame
+        :return: the cpacs document as string
+        """
+        if self.mode != "r":
+            raise RuntimeError("Snapshots can only be read from a store opened with mode 'r'")
+
+        self._deltas.seek(self._offsets[frame])
+        record = json.loads(self._deltas.readline().decode("utf-8"))
+
+        lines = list(self._base_lines(record["base"]))
+        for line_idx, line in record["lines"].items():
+            lines[int(line_idx)] = line
+        return "".join(lines)
+
+    def close(self):
+        self._deltas.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
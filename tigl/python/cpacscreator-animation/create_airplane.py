@@ -1,3 +1,6 @@
+import os
+import shutil
+
 import numpy as np
 
 import tigl3.configuration
@@ -5,11 +8,24 @@ import tigl3.geometry
 import tigl3.tigl3wrapper
 import tixi3.tixi3wrapper
 
-from OCC.Display.SimpleGui import init_display
-from OCC.BRepBndLib import brepbndlib_Add
-from OCC.Bnd import Bnd_Box
 import OCC.Quantity
 
+import bounding_boxes
+import cpacs_snapshots
+import frame_cache
+import frame_writer
+import headless_renderer
+import parameter_schema
+import tracing
+
+# size of the display (width, height) and hence of the frames of the animation
+display_size = (1024, 768)
+
+# the camera of the animation, see V3d_View::SetProj, SetAt and SetScale
+view_proj = (-1, -1, 1)
+view_at = (5, 0, 0)
+view_scale = 90
+
 # The following parameters will be modified smoothly in an animation (in the given order!).
 # Note, that these parameters don't have to be cpacs parameters. Here, the final values are defined.
 smooth_parameters_final = {
@@ -89,24 +105,30 @@ def interpolate_parameters(p0, p1, theta):
     return p
 
 
-def deduce_parameters(aircraft):
+@tracing.traced()
+def deduce_parameters(aircraft, bbox_cache=None):
     """
     Given a tigl handle to the cpacs node of the aircraft, try to deduce the parameters to get initial
     conditions for the animation. Note that this only works well for the simple initial geometries.
     :param aircraft: a tigl handle to the cpacs node of the aircraft
+    :param bbox_cache: optional BoundingBoxCache of the aircraft, see bounding_boxes.py. Pass the same cache to all
+                       calls for an aircraft, so that the boxes of unchanged lofts are not computed again
     :return: a parameters dictionary
     """
 
     params = {"fuselage": {}, "wing_main": {}, "wing_htp": {}, "wing_vtp": {}}
 
+    # compute the bounding boxes of all components in one go
+    if bbox_cache is None:
+        bbox_cache = bounding_boxes.BoundingBoxCache(aircraft)
+    with tracing.span("bounding_boxes"):
+        bboxes = bbox_cache.get_all(["fuselage", "wing_main", "wing_htp", "wing_vtp"])
+
 
     # deduce fuselage parameters
 
     fuselage = aircraft.get_fuselages().get_fuselage("fuselage")
-    shape = fuselage.get_loft().shape()
-    bbox = Bnd_Box()
-    brepbndlib_Add(shape, bbox)
-    xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+    xmin, ymin, zmin, xmax, ymax, zmax = bboxes["fuselage"]
 
     params["fuselage"]["length"] = xmax - xmin
     params["fuselage"]["section_height"] = zmax - zmin
@@ -152,10 +174,7 @@ def deduce_parameters(aircraft):
     # deduce main wing parameters
 
     wing_main = aircraft.get_wings().get_wing("wing_main")
-    shape = wing_main.get_loft().shape()
-    bbox = Bnd_Box()
-    brepbndlib_Add(shape, bbox)
-    xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+    xmin, ymin, zmin, xmax, ymax, zmax = bboxes["wing_main"]
 
     params["wing_main"]["root_leposition"] = wing_main.get_root_leposition()
     params["wing_main"]["scale"] = 1
@@ -177,10 +196,7 @@ def deduce_parameters(aircraft):
     # deduce htp wing parameters
 
     wing_htp = aircraft.get_wings().get_wing("wing_htp")
-    shape = wing_htp.get_loft().shape()
-    bbox = Bnd_Box()
-    brepbndlib_Add(shape, bbox)
-    xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+    xmin, ymin, zmin, xmax, ymax, zmax = bboxes["wing_htp"]
 
     params["wing_htp"]["root_leposition"] = wing_htp.get_root_leposition()
     params["wing_htp"]["sweep"] = 0
@@ -191,10 +207,7 @@ def deduce_parameters(aircraft):
     # deduce vtp wing parameters
 
     wing_vtp = aircraft.get_wings().get_wing("wing_vtp")
-    shape = wing_vtp.get_loft().shape()
-    bbox = Bnd_Box()
-    brepbndlib_Add(shape, bbox)
-    xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+    xmin, ymin, zmin, xmax, ymax, zmax = bboxes["wing_vtp"]
 
     params["wing_vtp"]["root_leposition"] = wing_vtp.get_root_leposition()
     params["wing_vtp"]["rotation"] = tigl3.geometry.CTiglPoint(0, 0, 0)
@@ -206,72 +219,89 @@ def deduce_parameters(aircraft):
     return params
 
 
-def modify_parameters(aircraft, params):
+@tracing.traced()
+def modify_fuselage(aircraft, params):
     """
-    modify the parameters of an aircraft instance according to the parameters defined in the dictionary params
+    modify the fuselage according to its parameters
     :param aircraft: a tigl handle to the cpacs node of the aircraft
-    :param params: a dictionary containing the parameter values
-    :return: a list of the aircraft's lofts (i.e. fuselage, main wing, vtp and htp)
+    :param params: the parameter dictionary of the component, e.g. params["fuselage"]
+    :return: a list of the component's lofts
     """
-    # collect all relevant lofts of the airplane (fuselage, main wing, htp, vtp)
     lofts = []
 
     # shape the fuselage
     fuselage = aircraft.get_fuselages().get_fuselage("fuselage")
-    # fuselage.set_length(params["fuselage"]["length"])
+    # fuselage.set_length(params["length"])
     for i in range(1, fuselage.get_section_count()+1):
         e = fuselage.get_section(i).get_section_element(1)
         ce = e.get_ctigl_section_element()
-        ce.set_height(params["fuselage"]["section_height"])
-        ce.set_width(params["fuselage"]["section_width"])
+        ce.set_height(params["section_height"])
+        ce.set_width(params["section_width"])
 
     # shrink nose to a point
     s1 = fuselage.get_section(1)
     s1e1 = s1.get_section_element(1)
     s1e1ce = s1e1.get_ctigl_section_element()
-    s1e1ce.set_center(params["fuselage"]["nose_center"])
-    s1e1ce.set_area(params["fuselage"]["nose_area"])
+    s1e1ce.set_center(params["nose_center"])
+    s1e1ce.set_area(params["nose_area"])
 
     # move second section towards the nose
     s2 = fuselage.get_section(2)
     s2e1 = s2.get_section_element(1)
     s2e1ce = s2e1.get_ctigl_section_element()
-    s2e1ce.set_center(params["fuselage"]["section_2_center"])
-    s2e1ce.set_area(params["fuselage"]["section_2_area"])
+    s2e1ce.set_center(params["section_2_center"])
+    s2e1ce.set_area(params["section_2_area"])
 
     # move second section towards the nose
     s3 = fuselage.get_section(3)
     s3e1 = s3.get_section_element(1)
     s3e1ce = s3e1.get_ctigl_section_element()
-    s3e1ce.set_center(params["fuselage"]["section_3_center"])
-    s3e1ce.set_area(params["fuselage"]["section_3_area"])
+    s3e1ce.set_center(params["section_3_center"])
+    s3e1ce.set_area(params["section_3_area"])
 
     # move fourth section towards the tail
     s4 = fuselage.get_section(4)
     s4e1 = s4.get_section_element(1)
     s4e1ce = s4e1.get_ctigl_section_element()
-    s4e1ce.set_center(params["fuselage"]["section_4_center"])
-    s4e1ce.set_area(params["fuselage"]["section_4_area"])
+    s4e1ce.set_center(params["section_4_center"])
+    s4e1ce.set_area(params["section_4_area"])
 
     # transform the tail
     tail_idx = fuselage.get_section_count()
     st = fuselage.get_section(tail_idx)
     ste1 = st.get_section_element(1)
     ste1ce = ste1.get_ctigl_section_element()
-    ste1ce.set_center(params["fuselage"]["tail_center"])
-    # tail_angle = np.deg2rad(params["fuselage"]["tail_angle"])
+    ste1ce.set_center(params["tail_center"])
+    # tail_angle = np.deg2rad(params["tail_angle"])
     # ste1ce.set_normal(tigl3.geometry.CTiglPoint(np.cos(tail_angle), 0, np.sin(tail_angle)))
-    ste1ce.set_width(params["fuselage"]["tail_width"])
-    ste1ce.set_height(params["fuselage"]["tail_height"])
+    ste1ce.set_width(params["tail_width"])
+    ste1ce.set_height(params["tail_height"])
 
-    lofts.append(fuselage.get_loft())
+    with tracing.span("fuselage.get_loft"):
+        lofts.append(fuselage.get_loft())
+
+    return lofts
+
+
+@tracing.traced()
+def modify_wing_main(aircraft, params):
+    """
+    modify the main wing according to its parameters
+    :param aircraft: a tigl handle to the cpacs node of the aircraft
+    :param params: the parameter dictionary of the component, e.g. params["wing_main"]
+    :return: a list of the component's lofts
+    """
+    lofts = []
 
     # shape main wing
     wing_main = aircraft.get_wings().get_wing("wing_main")
-    wing_main.set_root_leposition(params["wing_main"]["root_leposition"])
-    wing_main.scale(params["wing_main"]["scale"])
-    wing_main_half_span = params["wing_main"]["half_span"]
-    wing_main.set_half_span_keep_area(wing_main_half_span)
+    wing_main.set_root_leposition(params["root_leposition"])
+    # the scaling is relative to the current size of the wing, i.e. the modification is not idempotent, see
+    # relative_parameters
+    wing_main.scale(params["scale"])
+    wing_main_half_span = params["half_span"]
+    with tracing.span("wing_main.set_half_span_keep_area"):
+        wing_main.set_half_span_keep_area(wing_main_half_span)
 
     # move second to last section towards tip
     tip_idx = wing_main.get_section_count()
@@ -281,17 +311,17 @@ def modify_parameters(aircraft, params):
     e = s.get_section_element(1)
     ce = e.get_ctigl_section_element()
     center = ce.get_center()
-    theta = params["wing_main"]["section_2_rel_pos"]
+    theta = params["section_2_rel_pos"]
     center.x = theta * tip.x + (1 - theta) * pre_tip.x
     center.y = theta * tip.y + (1 - theta) * pre_tip.y
     center.z = theta * tip.z + (1 - theta) * pre_tip.z
     ce.set_center(center)
 
     # decrease section size towards wing tips
-    root_width = params["wing_main"]["root_width"]
-    root_height = params["wing_main"]["root_height"]
-    tip_width = params["wing_main"]["tip_width"]
-    tip_height = params["wing_main"]["tip_height"]
+    root_width = params["root_width"]
+    root_height = params["root_height"]
+    tip_width = params["tip_width"]
+    tip_height = params["tip_height"]
     n_sections = wing_main.get_section_count()
     for idx in range(1, n_sections + 1):
         s = wing_main.get_section(idx)
@@ -303,95 +333,373 @@ def modify_parameters(aircraft, params):
         ce.set_width((1 - theta) * root_width + theta * tip_width)
         ce.set_height((1 - theta) * root_height + theta * tip_height)
 
-    wing_main.set_sweep(params["wing_main"]["sweep"])
-    wing_main.set_dihedral(params["wing_main"]["dihedral"])
+    with tracing.span("wing_main.set_sweep"):
+        wing_main.set_sweep(params["sweep"])
+    with tracing.span("wing_main.set_dihedral"):
+        wing_main.set_dihedral(params["dihedral"])
 
     # create winglet
     s = wing_main.get_section(tip_idx)
     e = s.get_section_element(1)
     ce = e.get_ctigl_section_element()
     pre_tip = wing_main.get_section(tip_idx - 1).get_section_element(1).get_ctigl_section_element().get_center()
-    ce.set_center(pre_tip + params["wing_main"]["winglet_center_translation"])
-    s.set_rotation(params["wing_main"]["winglet_rotation"])
-    ce.set_width(params["wing_main"]["winglet_width"])
+    ce.set_center(pre_tip + params["winglet_center_translation"])
+    s.set_rotation(params["winglet_rotation"])
+    ce.set_width(params["winglet_width"])
 
-    lofts.append(wing_main.get_loft())
-    lofts.append(wing_main.get_mirrored_loft())
+    with tracing.span("wing_main.get_loft"):
+        lofts.append(wing_main.get_loft())
+    with tracing.span("wing_main.get_mirrored_loft"):
+        lofts.append(wing_main.get_mirrored_loft())
+
+    return lofts
+
+
+@tracing.traced()
+def modify_wing_htp(aircraft, params):
+    """
+    modify the horizontal tailplane according to its parameters
+    :param aircraft: a tigl handle to the cpacs node of the aircraft
+    :param params: the parameter dictionary of the component, e.g. params["wing_htp"]
+    :return: a list of the component's lofts
+    """
+    lofts = []
 
     # shape htp
     wing_htp = aircraft.get_wings().get_wing("wing_htp")
 
-    wing_htp.set_root_leposition(params["wing_htp"]["root_leposition"])
-    wing_htp.set_sweep(params["wing_htp"]["sweep"])
-    wing_htp.set_dihedral(params["wing_htp"]["dihedral"])
+    wing_htp.set_root_leposition(params["root_leposition"])
+    with tracing.span("wing_htp.set_sweep"):
+        wing_htp.set_sweep(params["sweep"])
+    with tracing.span("wing_htp.set_dihedral"):
+        wing_htp.set_dihedral(params["dihedral"])
 
     tip_idx = wing_htp.get_section_count()
     s = wing_htp.get_section(tip_idx)
     e = s.get_section_element(1)
     ce = e.get_ctigl_section_element()
-    ce.set_width(params["wing_htp"]["tip_width"])
-    ce.set_height(params["wing_htp"]["tip_height"])
+    ce.set_width(params["tip_width"])
+    ce.set_height(params["tip_height"])
+
+    with tracing.span("wing_htp.get_loft"):
+        lofts.append(wing_htp.get_loft())
+    with tracing.span("wing_htp.get_mirrored_loft"):
+        lofts.append(wing_htp.get_mirrored_loft())
+
+    return lofts
 
-    lofts.append(wing_htp.get_loft())
-    lofts.append(wing_htp.get_mirrored_loft())
+
+@tracing.traced()
+def modify_wing_vtp(aircraft, params):
+    """
+    modify the vertical tailplane according to its parameters
+    :param aircraft: a tigl handle to the cpacs node of the aircraft
+    :param params: the parameter dictionary of the component, e.g. params["wing_vtp"]
+    :return: a list of the component's lofts
+    """
+    lofts = []
 
     # shape vtp
     wing_vtp = aircraft.get_wings().get_wing("wing_vtp")
 
-    wing_vtp.set_root_leposition(params["wing_vtp"]["root_leposition"])
-    wing_vtp.set_rotation(params["wing_vtp"]["rotation"])
-    wing_vtp.set_sweep(params["wing_vtp"]["sweep"])
+    wing_vtp.set_root_leposition(params["root_leposition"])
+    wing_vtp.set_rotation(params["rotation"])
+    with tracing.span("wing_vtp.set_sweep"):
+        wing_vtp.set_sweep(params["sweep"])
 
     tip_idx = wing_vtp.get_section_count()
     s = wing_vtp.get_section(tip_idx)
     e = s.get_section_element(1)
     ce = e.get_ctigl_section_element()
-    ce.set_width(params["wing_vtp"]["tip_width"])
-    ce.set_height(params["wing_vtp"]["tip_height"])
+    ce.set_width(params["tip_width"])
+    ce.set_height(params["tip_height"])
 
-    lofts.append(wing_vtp.get_loft())
+    with tracing.span("wing_vtp.get_loft"):
+        lofts.append(wing_vtp.get_loft())
 
     return lofts
 
 
-def show_lofts(display, lofts, write_screenshots=True, basename='animation_', counter=0):
+# the components of the airplane in the order their lofts are returned by modify_parameters
+component_modifiers = [
+    ("fuselage", modify_fuselage),
+    ("wing_main", modify_wing_main),
+    ("wing_htp", modify_wing_htp),
+    ("wing_vtp", modify_wing_vtp)
+]
 
-    #TODO: It would be awesome if I could update the shapes and not erase and redraw
-    display.EraseAll()
 
-    for loft in lofts:
-        display.DisplayShape(loft.shape(), update=False)
+def parameter_key(component_params):
+    """
+    creates a hashable key from the parameter dictionary of a component
+    :param component_params: the parameter dictionary of a component, e.g. params["wing_htp"]
+    :return: a tuple containing all parameter values
+    """
+    key = []
+    for parameter in sorted(component_params):
+        value = component_params[parameter]
+        if isinstance(value, tigl3.geometry.CTiglPoint):
+            value = (value.x, value.y, value.z)
+        key.append((parameter, value))
+    return tuple(key)
+
+
+# parameters that are applied relative to the current state of a component, with their neutral value. E.g.
+# wing_main.scale scales the wing as it is, hence applying the same scale twice scales the wing twice
+relative_parameters = {
+    "wing_main": {"scale": 1}
+}
+
+
+class LoftCache(object):
+    """
+    Remembers the parameters that were last applied to each component together with the resulting lofts. If the
+    parameters of a component did not change, the component is not modified at all, so that TiGL does not
+    invalidate and rebuild its geometry. This only saves rebuilds, if some components keep their parameters between
+    two calls, e.g. in an animation moving one component at a time. In the animation of this script all components
+    change in every frame of the main animation.
+
+    Only the most recent parameter set is stored per component: the aircraft is modified in place, hence lofts of
+    older parameter sets do not match the current cpacs configuration anymore.
+
+    A component with a relative parameter (see relative_parameters) is only skipped, if that parameter has its neutral
+    value. Otherwise, applying the parameters again would change the component, hence skipping it would not be the
+    same as modifying it.
+    """
+
+    def __init__(self, tolerance=1e-9):
+        """
+        :param tolerance: parameters differing by no more than this value are regarded as unchanged
+        """
+        self.tolerance = tolerance
+        self._entries = {}
+        self.hits = {}
+        self.misses = {}
+
+    def _unchanged(self, key, previous_key):
+        if len(key) != len(previous_key):
+            return False
+        for (name, value), (previous_name, previous_value) in zip(key, previous_key):
+            if name != previous_name or np.max(np.abs(np.subtract(value, previous_value))) > self.tolerance:
+                return False
+        return True
+
+    def get(self, component, component_params, modify):
+        """
+        returns the lofts of a component, calling modify only if the component's parameters changed
+        :param component: the name of the component, e.g. "wing_htp"
+        :param component_params: the parameter dictionary of the component
+        :param modify: a function without arguments, that modifies the component and returns its lofts
+        :return: a list of the component's lofts
+        """
+        key = parameter_key(component_params)
+        entry = self._entries.get(component)
+        idempotent = all(component_params.get(name, neutral) == neutral
+                         for name, neutral in relative_parameters.get(component, {}).items())
+        if entry is not None and idempotent and self._unchanged(key, entry[0]):
+            self.hits[component] = self.hits.get(component, 0) + 1
+            return entry[1]
+
+        self.misses[component] = self.misses.get(component, 0) + 1
+        lofts = modify()
+        self._entries[component] = (key, lofts)
+        return lofts
+
+    def invalidate(self, component=None):
+        """
+        removes the cached lofts of one or all components, e.g. after the aircraft was modified elsewhere
+        :param component: the name of the component. If None, the whole cache is cleared
+        """
+        if component is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(component, None)
+
+    def stats(self):
+        """
+        :return: a dictionary containing the number of hits and misses for each component
+        """
+        return dict((component, {"hits": self.hits.get(component, 0), "misses": self.misses.get(component, 0)})
+                    for component in set(self.hits) | set(self.misses))
+
+    def print_stats(self):
+        stats = self.stats()
+        print("%-45s %8s %8s" % ("loft cache", "hits", "misses"))
+        for component, _ in component_modifiers:
+            if component in stats:
+                print("%-45s %8d %8d" % (component, stats[component]["hits"], stats[component]["misses"]))
+
+
+@tracing.traced()
+def modify_parameters(aircraft, params, cache=None):
+    """
+    modify the parameters of an aircraft instance according to the parameters defined in the dictionary params
+    :param aircraft: a tigl handle to the cpacs node of the aircraft
+    :param params: a dictionary containing the parameter values
+    :param cache: an optional LoftCache. If given, components whose parameters did not change since the last call
+                  are not modified and their previous lofts are returned
+    :return: a list of the aircraft's lofts (i.e. fuselage, main wing, vtp and htp)
+    """
+    # collect all relevant lofts of the airplane (fuselage, main wing, htp, vtp)
+    lofts = []
+
+    for component, modify in component_modifiers:
+        if cache is None:
+            lofts += modify(aircraft, params[component])
+        else:
+            lofts += cache.get(component, params[component],
+                               lambda: modify(aircraft, params[component]))
+
+    return lofts
+
+
+class LoftScene(object):
+    """
+    Keeps track of the lofts shown in a display. When the scene is updated with a new list of lofts, only those
+    lofts whose geometry changed since the previous frame are erased and displayed again. Unchanged lofts keep
+    their AIS object and are not tessellated again.
+    """
+
+    def __init__(self, display):
+        self.display = display
+        # list of (shape, ais_shape) tuples of the currently displayed lofts
+        self._displayed = []
+
+    @tracing.traced("LoftScene.update")
+    def update(self, lofts):
+        """
+        updates the display such that it shows exactly the given lofts
+        :param lofts: the list of lofts of the current frame
+        :return: True, if any loft was erased or displayed, i.e. if the scene changed since the last update
+        """
+        shapes = [loft.shape() for loft in lofts]
+
+        # erase all lofts that are not part of the new frame (i.e. TiGL rebuilt their geometry)
+        kept = []
+        changed = False
+        for shape, ais_shape in self._displayed:
+            if any(shape.IsSame(s) for s in shapes):
+                kept.append((shape, ais_shape))
+            else:
+                self.display.Context.Remove(ais_shape, False)
+                changed = True
+
+        # display all new lofts
+        for shape in shapes:
+            if not any(shape.IsSame(s) for s, _ in kept):
+                with tracing.span("DisplayShape"):
+                    ais_shape = self.display.DisplayShape(shape, update=False)
+                if isinstance(ais_shape, list):
+                    ais_shape = ais_shape[0]
+                kept.append((shape, ais_shape))
+                changed = True
+
+        self._displayed = kept
+        return changed
+
+    def clear(self):
+        """
+        erases all lofts from the display
+        """
+        self.display.EraseAll()
+        self._displayed = []
+
+
+@tracing.traced()
+def show_lofts(display, lofts, write_screenshots=True, basename='animation_', counter=0, scene=None, writer=None,
+               frame_cache=None, key=None, cached_frame=None):
+    """
+    displays the lofts and optionally writes a screenshot or passes the frame to a frame writer
+    :param display: the display
+    :param lofts: the list of lofts to be displayed
+    :param write_screenshots: whether to dump the view to a png file
+    :param basename: the basename of the png files
+    :param counter: the frame counter, used for the filename of the screenshot
+    :param scene: optional LoftScene of the display. If given, only lofts that changed since the last frame are
+                  displayed again. If no loft changed, the previous frame is repeated without rendering.
+                  Otherwise, the display is erased and all lofts are redrawn.
+    :param writer: optional frame writer (see frame_writer.py). The frame is passed to the writer from memory.
+    :param frame_cache: optional FrameCache (see frame_cache.py), the frame passed to the writer is stored in it
+    :param key: the key of the frame in the frame cache
+    :param cached_frame: the frame taken from the frame cache. If given, lofts is ignored and the frame is passed
+                         to the writer without rendering it
+    :return: the incremented frame counter
+    """
 
-    display.View.SetProj(-1, -1, 1)
-    display.View.SetAt(5, 0, 0)
-    display.View.SetScale(90)
+    if cached_frame is not None:
+        if scene is not None:
+            # the display does not show this frame, hence the next frame has to be rendered from scratch
+            scene.clear()
+        if writer.n_frames > 0 and cached_frame is writer.last_frame:
+            writer.repeat()
+        else:
+            writer.append(cached_frame)
+        return counter + 1
+
+    if scene is not None:
+        changed = scene.update(lofts)
+    else:
+        display.EraseAll()
+        for loft in lofts:
+            with tracing.span("DisplayShape"):
+                display.DisplayShape(loft.shape(), update=False)
+        changed = True
+
+    if changed:
+        display.View.SetProj(*view_proj)
+        display.View.SetAt(*view_at)
+        display.View.SetScale(view_scale)
 
     if write_screenshots:
         filename = basename + str(counter).zfill(4) + '.png'
-        display.View.Dump(filename)
+        previous_filename = basename + str(counter - 1).zfill(4) + '.png'
+        if changed or not os.path.isfile(previous_filename):
+            with tracing.span("View.Dump"):
+                display.View.Dump(filename)
+        else:
+            # the scene is unchanged, just duplicate the previous screenshot
+            shutil.copyfile(previous_filename, filename)
+
+    if writer is not None:
+        if changed or writer.n_frames == 0:
+            with tracing.span("grab_frame"):
+                frame = frame_writer.grab_frame(display, display_size)
+            with tracing.span("encode_frame"):
+                writer.append(frame)
+        else:
+            writer.repeat()
+        if frame_cache is not None and key is not None and key not in frame_cache:
+            frame_cache.put(key, writer.last_frame)
+
+    if write_screenshots or writer is not None:
         counter += 1
 
     return counter
 
 
-if __name__ == "__main__":
-
-    # set some parameters for the animation
-
-    n_frames_still = 5  # how many frames should be used for still images
-    n_frames_animation = 20  # how many frames should be used for the main animation
-    basename_animation = 'result/animation_'
-    cpacs_file_out = 'out.xml'
-    write_screenshots = True
-    create_gif = True
+def init_animation_display(headless=False):
+    """
+    starts the display used to render the frames of the animation
+    :param headless: if True, the frames are rendered offscreen by headless_renderer.py, which does not need a window
+    :return: the display and the function to start the interactive event loop (None for a headless display)
+    """
+    if headless:
+        return headless_renderer.HeadlessDisplay(display_size), None
 
-    # start the display
-    display, start_display, add_menu, add_function_to_menu = init_display()
+    # imported here, as the gui backend is not needed for a headless display
+    from OCC.Display.SimpleGui import init_display
+    display, start_display, add_menu, add_function_to_menu = init_display(size=display_size)
     display.View.SetBackgroundColor(OCC.Quantity.Quantity_NOC_WHITE)
     display.hide_triedron()
+    return display, start_display
 
-    # initialize an empty aircraft from "empty.cpacs3.xml"
-    filename = "empty.cpacs3.xml"
+
+def open_aircraft(filename):
+    """
+    opens a cpacs file and returns a handle to its aircraft configuration
+    :param filename: the cpacs file, e.g. "empty.cpacs3.xml"
+    :return: the tixi handle, the tigl handle and a tigl handle to the cpacs node of the aircraft
+    """
     tixi_h = tixi3.tixi3wrapper.Tixi3()
     tixi_h.open(filename)
     tigl_h = tigl3.tigl3wrapper.Tigl3()
@@ -399,18 +707,77 @@ if __name__ == "__main__":
 
     mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
     aircraft = mgr.get_configuration(tigl_h._handle.value)
+    return tixi_h, tigl_h, aircraft
+
+
+def frame_inputs(filename, headless=False):
+    """
+    :param filename: the cpacs file the airplane is generated in
+    :param headless: whether the frames are rendered by the headless renderer
+    :return: the inputs shared by all frames of the animation, which are part of the key of each cached frame
+    """
+    return {
+        "cpacs": frame_cache.file_hash(filename),
+        "display_size": list(display_size),
+        "view": [list(view_proj), list(view_at), view_scale],
+        "headless": headless
+    }
+
+
+def count_frames(n_frames_still, n_frames_animation):
+    """
+    :return: the total number of frames yielded by animation_frames
+    """
+    return 5 * n_frames_still + n_frames_animation
+
+
+def animation_frames(aircraft, n_frames_still, n_frames_animation, easing=parameter_schema.linear, loft_cache=None,
+                     bbox_cache=None):
+    """
+    Generates an airplane from scratch inside the (empty) aircraft and yields the lofts of each frame of the animation.
+    Note that the aircraft is modified in place, i.e. the lofts of a frame depend on all preceding frames. To
+    reproduce a frame, all preceding frames have to be generated as well.
+    :param aircraft: a tigl handle to the cpacs node of an empty aircraft
+    :param n_frames_still: how many frames should be used for still images
+    :param n_frames_animation: how many frames should be used for the main animation
+    :param easing: the easing function of the main animation, see parameter_schema.py
+    :param loft_cache: the LoftCache of the main animation, e.g. to report its statistics. Defaults to a new cache
+    :param bbox_cache: the BoundingBoxCache of the aircraft used to deduce the initial parameters, see
+                       deduce_parameters. Defaults to a new cache
+    :return: a generator yielding the list of lofts for each frame
+    """
+    for key, lofts, cached_frame in keyed_animation_frames(aircraft, n_frames_still, n_frames_animation, {},
+                                                           easing=easing, loft_cache=loft_cache,
+                                                           bbox_cache=bbox_cache):
+        yield lofts
+
+
+def keyed_animation_frames(aircraft, n_frames_still, n_frames_animation, inputs, lookup=None,
+                           easing=parameter_schema.linear, loft_cache=None, bbox_cache=None):
+    """
+    Like animation_frames, but yields the key of each frame (see frame_cache.frame_key) as well. The aircraft is
+    modified for every frame, even if the frame is found by lookup: some modifications are relative to the current
+    state of the aircraft (e.g. the scaling of the main wing), hence a frame depends on all preceding frames. Only
+    the display and rendering of a cached frame are skipped. For the same reason, the key of each frame is chained
+    with the key of the preceding frame, i.e. a frame is only found in the cache if all preceding frames are equal.
+    :param inputs: the inputs shared by all frames, see frame_inputs
+    :param lookup: optional function returning the cached frame of a key, or None if it is not cached
+    :return: a generator yielding (key, lofts, cached_frame) for each frame. Either lofts or cached_frame is None
+    """
+
+    def still_frames(key):
+        # all still frames of a stage are the same, they are looked up once
+        cached_frame = lookup(key) if lookup is not None else None
+        for i in range(0, n_frames_still):
+            yield key, lofts if cached_frame is None else None, cached_frame
 
     # create a cylindrical fuselage and display for a few frames
     fuselages = aircraft.get_fuselages()
     fuselage = fuselages.create_fuselage("fuselage", 5, "fuselageCircleProfileuID")
     lofts = [fuselage.get_loft(), ]
 
-    frame_cnt = 0
-    for i in range(0, n_frames_still):
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
+    key = frame_cache.frame_key(inputs, "fuselage")
+    yield from still_frames(key)
 
     # create main wing and display for a few frames
     wings = aircraft.get_wings()
@@ -419,11 +786,8 @@ if __name__ == "__main__":
     wing_main.set_root_leposition(tigl3.geometry.CTiglPoint(-2, 0, 0))
     lofts.append(wing_main.get_loft())
 
-    for i in range(0, n_frames_still):
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
+    key = frame_cache.frame_key(inputs, "wing_main", previous=key)
+    yield from still_frames(key)
 
     # create the horizontal tailplane and display for a few frames
     wing_htp = wings.create_wing("wing_htp", 2, "NACA0012")
@@ -431,74 +795,254 @@ if __name__ == "__main__":
     wing_htp.set_root_leposition(tigl3.geometry.CTiglPoint(5, 0, 0))
     lofts.append(wing_htp.get_loft())
 
-    for i in range(0, n_frames_still):
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
+    key = frame_cache.frame_key(inputs, "wing_htp", previous=key)
+    yield from still_frames(key)
 
     # create the vertical tailplane and display for a few frames
     wing_vtp = wings.create_wing("wing_vtp", 2, "NACA0012")
     wing_vtp.set_root_leposition(tigl3.geometry.CTiglPoint(7, 0, 0))
     lofts.append(wing_vtp.get_loft())
 
-    for i in range(0, n_frames_still):
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
+    key = frame_cache.frame_key(inputs, "wing_vtp", previous=key)
+    yield from still_frames(key)
 
     # now that all parts of the airplane are defined and the topology is fixed, we can deduce the
     # initial condition of the parameters we want to change
-    p0 = deduce_parameters(aircraft)
+    p0 = deduce_parameters(aircraft, bbox_cache)
     p1 = smooth_parameters_final
 
+    # components whose parameters do not change between two frames are not rebuilt
+    if loft_cache is None:
+        loft_cache = LoftCache()
+
     # now smoothly change the chosen parameters from the initial to the final state to get an animation
     # note that we get a valid cpacs configuration for each frame of the animation
-    for i in range(0, n_frames_animation):
+    if n_frames_animation == 1:
+        theta = np.ones(1)
+    else:
+        theta = np.arange(n_frames_animation) / (n_frames_animation - 1)
+
+    # the parameter sets of all frames are computed at once, a frame's dictionary is created only when it is needed
+    schema = parameter_schema.ParameterSchema(p1)
+    frames = schema.interpolate(p0, p1, theta, easing=easing)
+    for i in range(len(frames)):
+        vector = frames.vectors[i]
+        lofts = modify_parameters(aircraft, frames[i], cache=loft_cache)
+        key = frame_cache.frame_key(inputs, "animation", vector, previous=key)
+        cached_frame = lookup(key) if lookup is not None else None
+        yield key, lofts if cached_frame is None else None, cached_frame
+
+    # create a few frames of the finished airplane, they show the same lofts as the last frame of the main animation
+    # or, without a main animation, as the still frames of the vertical tailplane
+    yield from still_frames(key)
+
+
+def render_frame_range(args):
+    """
+    Renders the frames first, ..., last-1 of the animation in a worker process. Each worker opens its own
+    display and its own tixi/tigl handles and replays all frames preceding its share without rendering them.
+    :param args: a tuple (filename, first, last, settings), where settings is a dictionary containing
+                 n_frames_still, n_frames_animation, write_screenshots, basename_animation, grab_frames and
+                 optionally headless, frame_cache_dir and frame_cache_max_bytes
+    :return: a tuple (frames, config_as_string). frames is the list of rendered images, if grab_frames is set.
+             config_as_string is the cpacs configuration of the finished airplane, if the worker rendered the
+             last frame. Otherwise None
+    """
+    filename, first, last, settings = args
+
+    display, start_display = init_animation_display(settings.get("headless", False))
+    scene = LoftScene(display)
+    tixi_h, tigl_h, aircraft = open_aircraft(filename)
+
+    # the frames can only be cached, if they are grabbed from the display
+    cache = None
+    if settings.get("frame_cache_dir") is not None and settings["grab_frames"]:
+        cache = frame_cache.FrameCache(settings["frame_cache_dir"], settings.get("frame_cache_max_bytes", 1 << 30))
+
+    images = frame_writer.FrameList()
+    frames = keyed_animation_frames(aircraft, settings["n_frames_still"], settings["n_frames_animation"],
+                                    frame_inputs(filename, settings.get("headless", False)),
+                                    lookup=cache.get if cache is not None else None)
+    for frame_idx, (key, lofts, cached_frame) in enumerate(frames):
+        if frame_idx >= last:
+            break
+        if frame_idx >= first:
+            show_lofts(display, lofts,
+                       write_screenshots=settings["write_screenshots"],
+                       basename=settings["basename_animation"],
+                       counter=frame_idx,
+                       scene=scene,
+                       writer=images if settings["grab_frames"] else None,
+                       frame_cache=cache,
+                       key=key,
+                       cached_frame=cached_frame)
+
+    config_as_string = None
+    if last == count_frames(settings["n_frames_still"], settings["n_frames_animation"]):
+        aircraft.write_cpacs(aircraft.get_uid())
+        config_as_string = tixi_h.exportDocumentAsString()
+
+    return images.frames, config_as_string
+
+
+def render_frames_parallel(filename, settings, n_workers, writer=None):
+    """
+    Splits the frames of the animation into contiguous ranges and renders them on a pool of worker processes.
+    The screenshots are numbered by their global frame index and the frames are passed to the writer in order,
+    hence the result is the same as for the serial run.
+    :param filename: the empty cpacs file the airplane is generated in
+    :param settings: a dictionary containing n_frames_still, n_frames_animation, write_screenshots,
+                     basename_animation and optionally headless, frame_cache_dir and frame_cache_max_bytes
+    :param n_workers: the number of worker processes
+    :param writer: optional frame writer. Note that the frames of a worker's range are kept in memory until they
+                   are passed to the writer.
+    :return: the cpacs configuration of the finished airplane as string
+    """
+    import multiprocessing
+
+    settings = dict(settings, grab_frames=writer is not None)
+
+    n_frames = count_frames(settings["n_frames_still"], settings["n_frames_animation"])
+    bounds = np.linspace(0, n_frames, n_workers + 1).round().astype(int)
+    tasks = [(filename, first, last, settings) for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+    if not tasks:
+        # without any frames there is nothing to distribute, the airplane is generated in this process
+        images, config_as_string = render_frame_range((filename, 0, 0, settings))
+        return config_as_string
+
+    # spawn fresh processes, so that no OCC/display state of the parent process is shared with the workers
+    pool = multiprocessing.get_context("spawn").Pool(len(tasks))
+    try:
+        # imap returns the results in the order of the tasks
+        previous = None
+        for images, config_as_string in pool.imap(render_frame_range, tasks):
+            for image in images:
+                # repeated frames of a worker reference the same image
+                if image is previous:
+                    writer.repeat()
+                else:
+                    writer.append(image)
+                previous = image
+    finally:
+        pool.close()
+        pool.join()
+
+    return config_as_string
 
-        if n_frames_animation == 1:
-            theta = 1
-        else:
-            theta = i / (n_frames_animation - 1)
-
-        p = interpolate_parameters(p0, p1, theta)
-        lofts = modify_parameters(aircraft, p)
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
-
-    # create a few frames of the finished airplane
-    for i in range(0, n_frames_still):
-        frame_cnt = show_lofts(display, lofts,
-                               write_screenshots=write_screenshots,
-                               basename=basename_animation,
-                               counter=frame_cnt)
-
-    # write the CPACS file of the finished airplane. Note that we could move this into the for loop
-    # if we wanted to save the cpacs configuration at each increment
-    aircraft.write_cpacs(aircraft.get_uid())
-    config_as_string = tixi_h.exportDocumentAsString()
-    text_file = open(cpacs_file_out, "w")
-    text_file.write(config_as_string)
-    text_file.close()
 
-    # create an animated GIF from the generated screenshots, if imageio is available
+if __name__ == "__main__":
+
+    # set some parameters for the animation
+
+    n_frames_still = 5  # how many frames should be used for still images
+    n_frames_animation = 20  # how many frames should be used for the main animation
+    basename_animation = 'result/animation_'
+    movie_file = 'movie.gif'  # the animation is streamed into this file, use *.mp4 for a video
+    cpacs_file_out = 'out.xml'
+    cpacs_snapshot_dir = None  # e.g. 'result/cpacs' to store the cpacs configuration of each frame (serial run only)
+    write_screenshots = True
+    create_gif = True
+    # how many processes should render the frames. With n_workers > 1, no interactive display is started. Note that
+    # each worker generates the geometry of all frames preceding its share, only the rendering runs in parallel
+    n_workers = 1
+    trace_file = None  # e.g. 'trace.json' to record a Chrome/Perfetto trace of the geometry pipeline (serial run only)
+    headless = False  # render the frames offscreen, e.g. on machines without X. No interactive display is started
+    frame_cache_dir = None  # e.g. 'frame_cache' to keep the rendered frames, a rerun only renders the changed frames
+    frame_cache_max_bytes = 2 << 30  # the least recently used frames are removed from the frame cache beyond this size
+
+    # open a writer that encodes each frame as soon as it is rendered, if imageio is available
+    outputs = []
+    if write_screenshots:
+        outputs.append(basename_animation)
     if create_gif:
+        outputs.append(movie_file)
+    writer = None
+    if outputs:
         try:
-            import imageio
-            import os
-
-            png_dir = 'result/'
-            images = []
-            for file_name in os.listdir(png_dir):
-                if file_name.endswith('.png'):
-                    file_path = os.path.join(png_dir, file_name)
-                    images.append(imageio.imread(file_path))
-            imageio.mimsave('movie.gif', images)
-        except:
+            writer = frame_writer.open_writer(outputs)
+        except ImportError:
             print("Not creating gif: imageio not available")
 
+    # without imageio, the screenshots are dumped by the display
+    dump_screenshots = write_screenshots and writer is None
+
+    # generate an aircraft from "empty.cpacs3.xml"
+    filename = "empty.cpacs3.xml"
+
+    if n_workers > 1 and count_frames(n_frames_still, n_frames_animation) > 0:
+        settings = {
+            "n_frames_still": n_frames_still,
+            "n_frames_animation": n_frames_animation,
+            "write_screenshots": dump_screenshots,
+            "basename_animation": basename_animation,
+            "headless": headless,
+            "frame_cache_dir": frame_cache_dir,
+            "frame_cache_max_bytes": frame_cache_max_bytes
+        }
+        config_as_string = render_frames_parallel(filename, settings, n_workers, writer=writer)
+        start_display = None
+    else:
+        # start the display
+        display, start_display = init_animation_display(headless)
+        scene = LoftScene(display)
+
+        tixi_h, tigl_h, aircraft = open_aircraft(filename)
+
+        tracer = tracing.enable() if trace_file is not None else None
+
+        # the cpacs configuration of each frame is stored as difference to a base configuration
+        snapshots = None
+        if cpacs_snapshot_dir is not None:
+            snapshots = cpacs_snapshots.SnapshotStore(cpacs_snapshot_dir, mode="w")
+
+        # the frames can only be cached, if they are passed to a writer
+        cache = None
+        if frame_cache_dir is not None and writer is not None:
+            cache = frame_cache.FrameCache(frame_cache_dir, frame_cache_max_bytes)
+
+        frame_cnt = 0
+        n_cached = 0
+        loft_cache = LoftCache()
+        frames = keyed_animation_frames(aircraft, n_frames_still, n_frames_animation, frame_inputs(filename, headless),
+                                        lookup=cache.get if cache is not None else None, loft_cache=loft_cache)
+        for key, lofts, cached_frame in frames:
+            frame_cnt = show_lofts(display, lofts,
+                                   write_screenshots=dump_screenshots,
+                                   basename=basename_animation,
+                                   counter=frame_cnt,
+                                   scene=scene,
+                                   writer=writer,
+                                   frame_cache=cache,
+                                   key=key,
+                                   cached_frame=cached_frame)
+            n_cached += cached_frame is not None
+            if snapshots is not None:
+                aircraft.write_cpacs(aircraft.get_uid())
+                snapshots.add(tixi_h.exportDocumentAsString())
+
+        if snapshots is not None:
+            snapshots.close()
+
+        if cache is not None:
+            print("%d of %d frames taken from the frame cache" % (n_cached, frame_cnt))
+
+        if tracer is not None:
+            tracer.write_chrome_trace(trace_file)
+            tracer.print_summary()
+            loft_cache.print_stats()
+
+        # get the CPACS configuration of the finished airplane
+        aircraft.write_cpacs(aircraft.get_uid())
+        config_as_string = tixi_h.exportDocumentAsString()
+
+    if writer is not None:
+        writer.close()
+
+    # write the CPACS file of the finished airplane
+    text_file = open(cpacs_file_out, "w")
+    text_file.write(config_as_string)
+    text_file.close()
+
     # make display interactive
-    start_display()
+    if start_display is not None:
+        start_display()
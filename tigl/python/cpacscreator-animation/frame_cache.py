@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+def frame_key(inputs, stage, vector=None, previous=None, decimals=9):
+    """
+    creates the key of a frame from everything the rendered image depends on
+    :param inputs: a json serializable dictionary of the inputs shared by all frames, e.g. the camera and render
+                   settings and a hash of the cpacs file
+    :param stage: the stage of the animation, e.g. "fuselage" for the still frames of the fuselage
+    :param vector: the parameter vector of the frame (see parameter_schema.py), if it has one
+    :param previous: the key of the preceding frame, if the frame depends on the preceding frames. Chaining the keys
+                     makes the key depend on the whole sequence of frames up to this frame
+    :param decimals: the parameters are rounded to this number of decimals, so that round-off does not change the key
+    :return: the key as hex string
+    """
+    h = hashlib.sha1(json.dumps(inputs, sort_keys=True).encode("utf-8"))
+    h.update(b"\0" + stage.encode("utf-8"))
+    if previous is not None:
+        h.update(b"\0" + previous.encode("utf-8"))
+    if vector is not None:
+        # adding 0. turns -0. into 0.
+        h.update(b"\0" + (np.round(np.asarray(vector, dtype=np.float64), decimals) + 0.).tobytes())
+    return h.hexdigest()
+
+
+def file_hash(filename):
+    """
+    :return: the sha1 hash of a file's content
+    """
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FrameCache(object):
+    """
+    Content addressed on-disk cache of rendered frames. Each frame is stored as <key>.npy, where the key is a hash
+    of the frame's inputs (see frame_key). If the cache grows beyond its maximum size, the least recently used
+    frames are removed. Several processes may use the same directory.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        :param directory: the directory of the cache, it is created if necessary
+        :param max_bytes: the maximum total size of the cached frames
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def __contains__(self, key):
+        return os.path.isfile(self._filename(key))
+
+    def get(self, key):
+        """
+        :return: the frame as numpy array, or None if it is not in the cache
+        """
+        filename = self._filename(key)
+        try:
+            frame = np.load(filename)
+            # the modification time orders the frames for the eviction
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        """
+        stores a frame. The file is moved into the cache when it is complete, so that other processes never read
+        a partial frame
+        """
+        fd, tmp_file = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(frame))
+            os.replace(tmp_file, self._filename(key))
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        self.evict()
+
+    def evict(self):
+        """
+        removes the least recently used frames until the cache is not larger than max_bytes
+        :return: the number of removed frames
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for mtime, size, name in entries)
+        removed = 0
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
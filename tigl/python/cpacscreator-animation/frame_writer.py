@@ -0,0 +1,178 @@
+import os
+import shutil
+
+import numpy as np
+
+
+def grab_frame(display, size):
+    """
+    reads the current image of the display into memory, without writing it to disk
+    :param display: the display
+    :param size: the size (width, height) of the display
+    :return: the image as numpy array of shape (height, width, 3) and type uint8
+    """
+    width, height = size
+    try:
+        data = display.GetImageData(width, height)
+    except TypeError:
+        # older pythonocc versions always return the image data of the full window
+        data = display.GetImageData()
+    frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+    # the rows of the image data start at the bottom
+    return frame[::-1]
+
+
+class FrameWriter(object):
+    """
+    Base class of all frame writers. Frames are appended one by one as they are produced.
+    """
+
+    def __init__(self):
+        self.n_frames = 0
+        self._last_frame = None
+
+    def append(self, frame):
+        """
+        appends a frame
+        :param frame: the image as numpy array of shape (height, width, 3)
+        """
+        self.write(frame)
+        self._last_frame = frame
+        self.n_frames += 1
+
+    @property
+    def last_frame(self):
+        """
+        the most recently appended frame, or None
+        """
+        return self._last_frame
+
+    def repeat(self):
+        """
+        appends the last frame again, e.g. if the scene did not change
+        """
+        self.write_repeated(self._last_frame)
+        self.n_frames += 1
+
+    def write(self, frame):
+        raise NotImplementedError()
+
+    def write_repeated(self, frame):
+        self.write(frame)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PngWriter(FrameWriter):
+    """
+    Writes each frame to a separate png file basename0000.png, basename0001.png, ...
+    """
+
+    def __init__(self, basename):
+        super(PngWriter, self).__init__()
+        import imageio
+        self._imageio = imageio
+        self.basename = basename
+        directory = os.path.dirname(basename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def filename(self, idx):
+        return self.basename + str(idx).zfill(4) + '.png'
+
+    def write(self, frame):
+        self._imageio.imwrite(self.filename(self.n_frames), frame)
+
+    def write_repeated(self, frame):
+        # no need to encode the frame again
+        shutil.copyfile(self.filename(self.n_frames - 1), self.filename(self.n_frames))
+
+
+class MovieWriter(FrameWriter):
+    """
+    Streams the frames into an animated GIF or a MP4 video. Only the frame currently being encoded is kept in
+    memory, independent of the length of the animation. Writing MP4 files requires the imageio ffmpeg plugin.
+    """
+
+    def __init__(self, filename, **kwargs):
+        """
+        :param filename: the output file, the format is deduced from the extension (e.g. movie.gif or movie.mp4)
+        :param kwargs: further options of the imageio writer, e.g. fps
+        """
+        super(MovieWriter, self).__init__()
+        import imageio
+        self.filename = filename
+        self._writer = imageio.get_writer(filename, mode='I', **kwargs)
+
+    def write(self, frame):
+        self._writer.append_data(frame)
+
+    def close(self):
+        self._writer.close()
+
+
+class FrameList(FrameWriter):
+    """
+    Keeps all frames in a list, e.g. to pass them from a worker process to the actual writer. Repeated frames
+    reference the same image.
+    """
+
+    def __init__(self):
+        super(FrameList, self).__init__()
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+
+class MultiWriter(FrameWriter):
+    """
+    Appends each frame to several writers, e.g. to write a GIF and the png files at the same time
+    """
+
+    def __init__(self, writers):
+        super(MultiWriter, self).__init__()
+        self.writers = writers
+
+    def write(self, frame):
+        for writer in self.writers:
+            writer.append(frame)
+
+    def write_repeated(self, frame):
+        for writer in self.writers:
+            writer.repeat()
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def open_writer(filenames, **kwargs):
+    """
+    creates a frame writer for the given output files
+    :param filenames: a filename or a list of filenames. Files ending with .gif or .mp4 are written as movie,
+                      anything else is used as basename for png files, e.g. "result/animation_"
+    :param kwargs: further options for the movie writers, e.g. fps
+    :return: the frame writer
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+
+    writers = []
+    for filename in filenames:
+        if os.path.splitext(filename)[1].lower() in (".gif", ".mp4"):
+            writers.append(MovieWriter(filename, **kwargs))
+        else:
+            writers.append(PngWriter(filename))
+
+    if len(writers) == 1:
+        return writers[0]
+    return MultiWriter(writers)
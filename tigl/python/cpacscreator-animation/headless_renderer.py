@@ -0,0 +1,356 @@
+"""
+Renders the frames of the animation offscreen, without a window or an X server. The shapes are tessellated and
+rasterized with numpy. HeadlessDisplay provides the parts of the pythonocc display used by create_airplane.py, hence
+it can be used in place of the display returned by init_display:
+
+    display = HeadlessDisplay((1024, 768))
+    display.DisplayShape(loft.shape(), update=False)
+    display.View.SetProj(-1, -1, 1)
+    display.View.SetAt(5, 0, 0)
+    display.View.SetScale(90)
+    frame = display.render()   # numpy array of shape (768, 1024, 3)
+"""
+
+import numpy as np
+
+from OCC.BRep import BRep_Tool
+from OCC.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCC.TopExp import TopExp_Explorer
+from OCC.TopLoc import TopLoc_Location
+from OCC.TopoDS import topods_Face
+
+# the height of the view in model units at scale 1, i.e. the default view size of the OCC viewer
+default_view_size = 1000.
+
+# the maximum number of fragments (candidate pixels) rasterized at once, which limits the temporary memory
+max_fragments = 1 << 22
+
+
+def _object(handle):
+    return handle.GetObject() if hasattr(handle, "GetObject") else handle
+
+
+def triangulate(shape, deflection=0.01, angular_deflection=0.5):
+    """
+    tessellates a shape. The vertices of each face are kept separately, hence normals computed from the triangles
+    are smooth within a face and sharp at the edges between faces. Also used by mesh_export.py of the
+    internal-api-utils
+    :param shape: a TopoDS_Shape
+    :return: the vertices as array of shape (n, 3) and the triangles as array of shape (m, 3) of vertex indices
+    """
+    BRepMesh_IncrementalMesh(shape, deflection, False, angular_deflection)
+
+    vertices = []
+    triangles = []
+    n_vertices = 0
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    while explorer.More():
+        face = topods_Face(explorer.Current())
+        explorer.Next()
+        location = TopLoc_Location()
+        triangulation = BRep_Tool().Triangulation(face, location)
+        if triangulation.IsNull():
+            continue
+        triangulation = _object(triangulation)
+        transformation = location.Transformation()
+
+        nodes = triangulation.Nodes()
+        points = [nodes.Value(i).Transformed(transformation) for i in range(nodes.Lower(), nodes.Upper() + 1)]
+        vertices.append(np.array([(p.X(), p.Y(), p.Z()) for p in points]).reshape(-1, 3))
+
+        face_triangles = triangulation.Triangles()
+        indices = np.array([face_triangles.Value(i).Get()
+                            for i in range(face_triangles.Lower(), face_triangles.Upper() + 1)]).reshape(-1, 3)
+        if face.Orientation() == TopAbs_REVERSED:
+            indices = indices[:, ::-1]
+        triangles.append(indices - nodes.Lower() + n_vertices)
+        n_vertices += len(points)
+
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+    return np.concatenate(vertices), np.concatenate(triangles)
+
+
+def vertex_normals(vertices, triangles):
+    """
+    :return: the area weighted normals of the vertices as array of shape (n, 3)
+    """
+    corners = vertices[triangles]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    normals = np.zeros_like(vertices)
+    for i in range(3):
+        np.add.at(normals, triangles[:, i], face_normals)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.
+    return normals / lengths[:, None]
+
+
+class Camera(object):
+    """
+    An orthographic camera, defined like the view of the OCC viewer
+    """
+
+    def __init__(self, proj=(-1, -1, 1), at=(0, 0, 0), scale=1., up=(0, 0, 1)):
+        """
+        :param proj: the direction from the target point to the eye, see V3d_View::SetProj
+        :param at: the target point, which is shown in the center of the image
+        :param scale: the zoom factor, see V3d_View::SetScale
+        :param up: the direction pointing upwards in the image
+        """
+        self.proj = np.array(proj, dtype=float)
+        self.at = np.array(at, dtype=float)
+        self.scale = float(scale)
+        self.up = np.array(up, dtype=float)
+
+    def axes(self):
+        """
+        :return: the directions of the image axes (right, up) and of the eye in model coordinates
+        """
+        eye = self.proj / np.linalg.norm(self.proj)
+        up = self.up - np.dot(self.up, eye) * eye
+        if np.linalg.norm(up) < 1e-12:
+            # looking along the up direction
+            up = np.array([0., 1., 0.]) - eye[1] * eye
+        up /= np.linalg.norm(up)
+        right = np.cross(-eye, up)
+        return right, up, eye
+
+    def project(self, points, size):
+        """
+        :param points: array of shape (n, 3)
+        :param size: the size of the image (width, height)
+        :return: the pixel coordinates (column, row) and the depth of the points as array of shape (n, 3). The depth
+                 increases towards the eye
+        """
+        width, height = size
+        right, up, eye = self.axes()
+        pixels_per_unit = height * self.scale / default_view_size
+        relative = points - self.at
+        return np.column_stack([width / 2. + relative.dot(right) * pixels_per_unit,
+                                height / 2. - relative.dot(up) * pixels_per_unit,
+                                relative.dot(eye)])
+
+
+def rasterize(vertices, triangles, colors, size, depth=None, image=None):
+    """
+    draws triangles into an image using a depth buffer
+    :param vertices: the projected vertices (column, row, depth), see Camera.project
+    :param triangles: array of shape (m, 3) of vertex indices
+    :param colors: the colors of the triangles as array of shape (m, 3)
+    :param size: the size of the image (width, height)
+    :param depth: the depth buffer of shape (height, width), which is updated
+    :param image: the image of shape (height, width, 3), which is updated
+    """
+    width, height = size
+    corners = vertices[triangles]
+
+    # the pixels, whose centers may be covered by the triangle
+    xmin = np.clip(np.ceil(corners[:, :, 0].min(axis=1) - 0.5), 0, width).astype(np.int64)
+    xmax = np.clip(np.floor(corners[:, :, 0].max(axis=1) - 0.5) + 1, 0, width).astype(np.int64)
+    ymin = np.clip(np.ceil(corners[:, :, 1].min(axis=1) - 0.5), 0, height).astype(np.int64)
+    ymax = np.clip(np.floor(corners[:, :, 1].max(axis=1) - 0.5) + 1, 0, height).astype(np.int64)
+    w = np.maximum(xmax - xmin, 0)
+    counts = w * np.maximum(ymax - ymin, 0)
+
+    # the signed doubled area of the triangles, degenerated triangles are skipped
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    counts[np.abs(area) < 1e-12] = 0
+
+    # process the triangles in batches, such that each batch has at most max_fragments candidate pixels
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(triangles):
+        limit = (ends[start - 1] if start > 0 else 0) + max_fragments
+        stop = max(start + 1, int(np.searchsorted(ends, limit, side="right")))
+        _rasterize_batch(np.arange(start, stop), corners, area, xmin, ymin, w, counts, colors, depth, image)
+        start = stop
+
+
+def _rasterize_batch(idx, corners, area, xmin, ymin, w, counts, colors, depth, image):
+    idx = idx[counts[idx] > 0]
+    if len(idx) == 0:
+        return
+    n = counts[idx]
+    tri = np.repeat(idx, n)
+    local = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    px = xmin[tri] + local % w[tri]
+    py = ymin[tri] + local // w[tri]
+    x, y = px + 0.5, py + 0.5
+
+    # barycentric coordinates of the pixel centers
+    a, b, c = corners[tri, 0], corners[tri, 1], corners[tri, 2]
+    l1 = ((c[:, 0] - b[:, 0]) * (y - b[:, 1]) - (c[:, 1] - b[:, 1]) * (x - b[:, 0])) / area[tri]
+    l2 = ((a[:, 0] - c[:, 0]) * (y - c[:, 1]) - (a[:, 1] - c[:, 1]) * (x - c[:, 0])) / area[tri]
+    l3 = 1. - l1 - l2
+    inside = (l1 >= 0) & (l2 >= 0) & (l3 >= 0)
+
+    z = l1 * a[:, 2] + l2 * b[:, 2] + l3 * c[:, 2]
+    px, py, z, tri = px[inside], py[inside], z[inside], tri[inside]
+
+    # keep the fragment closest to the eye for each pixel
+    pixel = py * depth.shape[1] + px
+    order = np.lexsort((-z, pixel))
+    pixel, z, tri = pixel[order], z[order], tri[order]
+    first = np.ones(len(pixel), dtype=bool)
+    first[1:] = pixel[1:] != pixel[:-1]
+    pixel, z, tri = pixel[first], z[first], tri[first]
+
+    flat_depth = depth.reshape(-1)
+    visible = z > flat_depth[pixel]
+    pixel = pixel[visible]
+    flat_depth[pixel] = z[visible]
+    image.reshape(-1, 3)[pixel] = colors[tri[visible]]
+
+
+class _DisplayedShape(object):
+    """
+    A tessellated shape of the display, it replaces the AIS object of the OCC display
+    """
+
+    def __init__(self, shape, vertices, triangles, color):
+        self.shape = shape
+        self.vertices = vertices
+        self.triangles = triangles
+        self.color = color
+
+
+class _View(object):
+    """
+    The camera methods of V3d_View used by create_airplane.py
+    """
+
+    def __init__(self, display):
+        self._display = display
+
+    def SetProj(self, vx, vy, vz):
+        self._display.camera.proj = np.array([vx, vy, vz], dtype=float)
+        self._display.invalidate()
+
+    def SetAt(self, x, y, z):
+        self._display.camera.at = np.array([x, y, z], dtype=float)
+        self._display.invalidate()
+
+    def SetScale(self, scale):
+        self._display.camera.scale = float(scale)
+        self._display.invalidate()
+
+    def Dump(self, filename):
+        import imageio
+        imageio.imwrite(filename, self._display.render())
+
+
+class _Context(object):
+    """
+    The methods of AIS_InteractiveContext used by create_airplane.py
+    """
+
+    def __init__(self, display):
+        self._display = display
+
+    def Remove(self, displayed_shape, update=False):
+        self._display.shapes.remove(displayed_shape)
+        self._display.invalidate()
+
+
+class HeadlessDisplay(object):
+    """
+    An offscreen replacement for the display of OCC.Display.SimpleGui. Shapes are tessellated when they are displayed
+    and rasterized with flat shading and a head light, when an image is requested.
+    """
+
+    def __init__(self, size=(1024, 768), color=(0.8, 0.65, 0.3), background=(1., 1., 1.), deflection=0.01,
+                 antialiasing=2):
+        """
+        :param size: the size (width, height) of the images
+        :param color: the default color of the shapes as rgb values between 0 and 1
+        :param background: the background color
+        :param deflection: the linear deflection of the tessellation
+        :param antialiasing: the images are rendered at this multiple of their size and scaled down
+        """
+        self.size = tuple(size)
+        self.color = np.array(color, dtype=float)
+        self.background = np.array(background, dtype=float)
+        self.deflection = deflection
+        self.antialiasing = int(antialiasing)
+        self.camera = Camera()
+        self.shapes = []
+        self.View = _View(self)
+        self.Context = _Context(self)
+        self._image = None
+
+    def invalidate(self):
+        self._image = None
+
+    def DisplayShape(self, shape, color=None, update=False):
+        """
+        tessellates a shape and adds it to the scene
+        :return: the displayed shape, which can be removed with Context.Remove
+        """
+        vertices, triangles = triangulate(shape, self.deflection)
+        displayed = _DisplayedShape(shape, vertices, triangles, self.color if color is None else np.array(color))
+        self.shapes.append(displayed)
+        self.invalidate()
+        return displayed
+
+    def EraseAll(self):
+        self.shapes = []
+        self.invalidate()
+
+    def hide_triedron(self):
+        pass
+
+    def render(self):
+        """
+        :return: the image of the scene as numpy array of shape (height, width, 3) and type uint8
+        """
+        if self._image is not None:
+            return self._image
+
+        width, height = self.size
+        k = self.antialiasing
+        size = (width * k, height * k)
+        depth = np.full((size[1], size[0]), -np.inf)
+        image = np.empty((size[1], size[0], 3))
+        image[:] = self.background
+
+        right, up, eye = self.camera.axes()
+        for displayed in self.shapes:
+            if len(displayed.triangles) == 0:
+                continue
+            corners = displayed.vertices[displayed.triangles]
+            normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            lengths = np.linalg.norm(normals, axis=1)
+            lengths[lengths == 0] = 1.
+            # head light, both sides of the faces are lit
+            intensity = 0.3 + 0.7 * np.abs(normals.dot(eye)) / lengths
+            colors = intensity[:, None] * displayed.color
+            rasterize(self.camera.project(displayed.vertices, size), displayed.triangles, colors, size, depth, image)
+
+        if k > 1:
+            image = image.reshape(height, k, width, k, 3).mean(axis=(1, 3))
+        self._image = np.round(np.clip(image, 0., 1.) * 255).astype(np.uint8)
+        return self._image
+
+    def GetImageData(self, width=None, height=None):
+        """
+        :return: the image as rgb bytes, the rows start at the bottom like in the OCC display
+        """
+        return self.render()[::-1].tobytes()
+
+
+def render_shapes(shapes, size=(1024, 768), proj=(-1, -1, 1), at=(5, 0, 0), scale=90, **kwargs):
+    """
+    renders shapes offscreen, by default with the camera of the animation
+    :param shapes: a list of TopoDS_Shape
+    :param kwargs: further options of HeadlessDisplay
+    :return: the image as numpy array of shape (height, width, 3) and type uint8
+    """
+    display = HeadlessDisplay(size, **kwargs)
+    for shape in shapes:
+        display.DisplayShape(shape)
+    display.View.SetProj(*proj)
+    display.View.SetAt(*at)
+    display.View.SetScale(scale)
+    return display.render()
@@ -0,0 +1,169 @@
+import numpy as np
+
+import tigl3.geometry
+
+
+def linear(theta):
+    """
+    linear easing, i.e. the parameters change with constant speed
+    :param theta: array of values between 0 and 1
+    :return: the interpolation weights
+    """
+    return np.asarray(theta, dtype=float)
+
+
+def smoothstep(theta):
+    """
+    smoothstep easing, i.e. the parameters start and stop with zero speed
+    :param theta: array of values between 0 and 1
+    :return: the interpolation weights
+    """
+    theta = np.asarray(theta, dtype=float)
+    return theta * theta * (3 - 2 * theta)
+
+
+def cubic(theta):
+    """
+    cubic ease-in-out, i.e. the parameters accelerate in the first half and decelerate in the second half
+    :param theta: array of values between 0 and 1
+    :return: the interpolation weights
+    """
+    theta = np.asarray(theta, dtype=float)
+    return np.where(theta < 0.5, 4 * theta ** 3, 1 - 0.5 * (2 - 2 * theta) ** 3)
+
+
+def keyframes(times, weights):
+    """
+    creates an easing function that linearly interpolates between keyframes
+    :param times: increasing values between 0 and 1, e.g. [0, 0.5, 1]
+    :param weights: the interpolation weights at the given times, e.g. [0, 1, 1] finishes the change at half time
+    :return: an easing function
+    """
+    times = np.asarray(times, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    def easing(theta):
+        return np.interp(theta, times, weights)
+
+    return easing
+
+
+class ParameterSchema(object):
+    """
+    A fixed layout of a nested parameter dictionary (see smooth_parameters_final in create_airplane.py) as a
+    flat vector of floats. Points (CTiglPoint) take three entries, scalars take one entry.
+    """
+
+    def __init__(self, params):
+        """
+        compiles the layout of a parameter dictionary
+        :param params: a parameter dictionary, e.g. smooth_parameters_final
+        """
+        # list of (component, parameter, offset, is_point)
+        self.layout = []
+        self.size = 0
+        for component in sorted(params):
+            for parameter in sorted(params[component]):
+                is_point = isinstance(params[component][parameter], tigl3.geometry.CTiglPoint)
+                self.layout.append((component, parameter, self.size, is_point))
+                self.size += 3 if is_point else 1
+
+    def names(self):
+        """
+        :return: a name for each entry of the parameter vector, e.g. "wing_htp.root_leposition.x"
+        """
+        names = []
+        for component, parameter, offset, is_point in self.layout:
+            if is_point:
+                names += ["%s.%s.%s" % (component, parameter, c) for c in "xyz"]
+            else:
+                names.append("%s.%s" % (component, parameter))
+        return names
+
+    def slice(self, component, parameter=None):
+        """
+        :return: the indices of a parameter (or of all parameters of a component) in the parameter vector
+        """
+        indices = []
+        for c, p, offset, is_point in self.layout:
+            if c == component and (parameter is None or p == parameter):
+                indices += range(offset, offset + (3 if is_point else 1))
+        return np.array(indices, dtype=int)
+
+    def flatten(self, params):
+        """
+        packs a parameter dictionary into a vector
+        :param params: a parameter dictionary with the layout of this schema
+        :return: a numpy array of shape (size,)
+        """
+        vector = np.empty(self.size)
+        for component, parameter, offset, is_point in self.layout:
+            value = params[component][parameter]
+            if is_point:
+                vector[offset:offset + 3] = (value.x, value.y, value.z)
+            else:
+                vector[offset] = value
+        return vector
+
+    def unflatten(self, vector):
+        """
+        unpacks a parameter vector into a parameter dictionary
+        :param vector: a numpy array of shape (size,)
+        :return: a parameter dictionary, as expected by modify_parameters
+        """
+        params = {}
+        for component, parameter, offset, is_point in self.layout:
+            if is_point:
+                value = tigl3.geometry.CTiglPoint(*(float(v) for v in vector[offset:offset + 3]))
+            else:
+                value = float(vector[offset])
+            params.setdefault(component, {})[parameter] = value
+        return params
+
+    def interpolate(self, p0, p1, theta, easing=linear, parameter_easing=None):
+        """
+        interpolates between two parameter sets for all frames at once
+        :param p0: first parameter set
+        :param p1: second parameter set
+        :param theta: array of N values between 0 and 1. theta=0 recreates p0, theta=1 recreates p1
+        :param easing: the easing function applied to all parameters, e.g. linear, smoothstep or cubic
+        :param parameter_easing: optional dictionary, that overrides the easing for single components or
+                                 parameters. The keys are component names or (component, parameter) tuples
+        :return: ParameterFrames containing N parameter sets
+        """
+        theta = np.asarray(theta, dtype=float)
+        v0 = self.flatten(p0)
+        v1 = self.flatten(p1)
+
+        weights = np.empty((len(theta), self.size))
+        weights[:] = easing(theta)[:, np.newaxis]
+        if parameter_easing is not None:
+            for key, parameter_easing_function in parameter_easing.items():
+                if isinstance(key, tuple):
+                    indices = self.slice(*key)
+                else:
+                    indices = self.slice(key)
+                weights[:, indices] = parameter_easing_function(theta)[:, np.newaxis]
+
+        return ParameterFrames(self, (1 - weights) * v0 + weights * v1)
+
+
+class ParameterFrames(object):
+    """
+    A sequence of parameter sets, stored as an array of shape (N, size). The parameter dictionaries are only
+    created when a frame is accessed.
+    """
+
+    def __init__(self, schema, vectors):
+        self.schema = schema
+        self.vectors = vectors
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def __getitem__(self, idx):
+        return self.schema.unflatten(self.vectors[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
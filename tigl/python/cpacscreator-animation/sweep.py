@@ -0,0 +1,329 @@
+"""
+Evaluates the airplane of create_airplane.py for many parameter sets without any display and writes geometric
+metrics of each configuration to a CSV (or Parquet) file.
+
+The parameter ranges are defined in a json file using the parameter names of parameter_schema.py, e.g.
+
+    {
+        "wing_main.sweep": [0, 30],
+        "wing_main.half_span": [6, 10],
+        "wing_htp.root_leposition.x": [9, 10]
+    }
+
+All other parameters keep the values of smooth_parameters_final. Usage:
+
+    python sweep.py ranges.json --method lhs --samples 1000 --workers 8 --output sweep.csv
+
+If the sweep is interrupted, running the same command again skips all configurations already in the output file.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+import tigl3.configuration
+import tigl3.tigl3wrapper
+import tixi3.tixi3wrapper
+
+from OCC.BRepGProp import brepgprop_SurfaceProperties, brepgprop_VolumeProperties
+from OCC.GProp import GProp_GProps
+
+import bounding_boxes
+import create_airplane
+import parameter_schema
+import tracing
+
+components = ["fuselage", "wing_main", "wing_htp", "wing_vtp"]
+
+
+def metric_names():
+    """
+    :return: the names of the metrics computed by evaluate, in the order of the output columns
+    """
+    names = ["wetted_area"]
+    for component in components:
+        names += [component + "." + metric for metric in ["extent_x", "extent_y", "extent_z", "surface_area",
+                                                          "volume"]]
+    names += [component + ".wetted_area" for component in components[1:]]
+    return sorted(names)
+
+
+def latin_hypercube(n_samples, n_dims, rng):
+    """
+    creates a latin hypercube sample in the unit cube
+    :return: array of shape (n_samples, n_dims)
+    """
+    sample = np.empty((n_samples, n_dims))
+    for dim in range(n_dims):
+        sample[:, dim] = (rng.permutation(n_samples) + rng.uniform(size=n_samples)) / n_samples
+    return sample
+
+
+def full_factorial(n_levels, n_dims):
+    """
+    creates a full factorial sample with n_levels equidistant levels per dimension in the unit cube
+    :return: array of shape (n_levels**n_dims, n_dims)
+    """
+    levels = np.linspace(0, 1, n_levels) if n_levels > 1 else np.array([0.5])
+    grid = np.meshgrid(*([levels] * n_dims), indexing="ij")
+    return np.stack([g.ravel() for g in grid], axis=1)
+
+
+def create_sample(ranges, method, n_samples, n_levels, seed):
+    """
+    :param ranges: an ordered list of (name, lower, upper) tuples
+    :return: array of shape (n, len(ranges)) with the parameter values of each configuration
+    """
+    if method == "lhs":
+        unit = latin_hypercube(n_samples, len(ranges), np.random.RandomState(seed))
+    elif method == "factorial":
+        unit = full_factorial(n_levels, len(ranges))
+    else:
+        raise ValueError("Invalid sampling method '%s'" % method)
+
+    lower = np.array([r[1] for r in ranges])
+    upper = np.array([r[2] for r in ranges])
+    return lower + unit * (upper - lower)
+
+
+def create_base_document(filename):
+    """
+    generates the topology of the airplane in the empty cpacs file
+    :return: the cpacs configuration as string
+    """
+    tixi_h, tigl_h, aircraft = create_airplane.open_aircraft(filename)
+    for lofts in create_airplane.animation_frames(aircraft, 0, 0):
+        pass
+    aircraft.write_cpacs(aircraft.get_uid())
+    return tixi_h.exportDocumentAsString()
+
+
+def shape_properties(lofts):
+    """
+    :return: the surface area and the volume of a list of lofts
+    """
+    area = 0.
+    volume = 0.
+    for loft in lofts:
+        props = GProp_GProps()
+        brepgprop_SurfaceProperties(loft.shape(), props)
+        area += props.Mass()
+        props = GProp_GProps()
+        brepgprop_VolumeProperties(loft.shape(), props)
+        volume += props.Mass()
+    return area, volume
+
+
+def evaluate(base_document, params):
+    """
+    applies a parameter set to the airplane and computes its geometric metrics
+    :param base_document: the cpacs configuration containing the topology of the airplane
+    :param params: a parameter dictionary as expected by create_airplane.modify_parameters
+    :return: a dictionary of metrics
+    """
+    # each configuration starts from a freshly opened base document, since some parameters (e.g. the wing scaling)
+    # are applied relative to the current state of the aircraft
+    tixi_h = tixi3.tixi3wrapper.Tixi3()
+    tixi_h.openString(base_document)
+    tigl_h = tigl3.tigl3wrapper.Tigl3()
+    tigl_h.open(tixi_h, "")
+
+    try:
+        mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+        aircraft = mgr.get_configuration(tigl_h._handle.value)
+
+        metrics = {}
+        lofts = {}
+        for component, modify in create_airplane.component_modifiers:
+            lofts[component] = modify(aircraft, params[component])
+
+        bboxes = bounding_boxes.BoundingBoxCache(aircraft).get_all(components)
+        for component in components:
+            xmin, ymin, zmin, xmax, ymax, zmax = bboxes[component]
+            metrics[component + ".extent_x"] = xmax - xmin
+            metrics[component + ".extent_y"] = ymax - ymin
+            metrics[component + ".extent_z"] = zmax - zmin
+
+            area, volume = shape_properties(lofts[component])
+            metrics[component + ".surface_area"] = area
+            metrics[component + ".volume"] = volume
+
+        # the wetted area excludes the parts of the wings inside the fuselage
+        wetted_area = metrics["fuselage.surface_area"]
+        for component in components[1:]:
+            metrics[component + ".wetted_area"] = tigl_h.wingGetWettedArea(component)
+            wetted_area += metrics[component + ".wetted_area"]
+        metrics["wetted_area"] = wetted_area
+
+        return metrics
+    finally:
+        tigl_h.close()
+        tixi_h.close()
+
+
+# state of a worker process, see init_worker
+_worker = {}
+
+
+def init_worker(base_document, names, trace):
+    if trace:
+        tracing.enable()
+    # the parameters contain CTiglPoints, which cannot be passed to a worker process, hence they are imported here
+    schema_params = create_airplane.smooth_parameters_final
+    _worker["base_document"] = base_document
+    _worker["schema"] = parameter_schema.ParameterSchema(schema_params)
+    _worker["base_vector"] = _worker["schema"].flatten(schema_params)
+    _worker["indices"] = [_worker["schema"].names().index(name) for name in names]
+
+
+def evaluate_sample(args):
+    """
+    evaluates a single configuration in a worker process
+    :param args: a tuple (index, values) with the index of the configuration and the values of the swept parameters
+    :return: a tuple (index, metrics, error, events). If the configuration could not be evaluated, metrics is None
+             and error is the error message. events contains the recorded trace events, if tracing is enabled
+    """
+    idx, values = args
+    vector = _worker["base_vector"].copy()
+    vector[_worker["indices"]] = values
+    error = None
+    try:
+        with tracing.span("evaluate", index=idx):
+            metrics = evaluate(_worker["base_document"], _worker["schema"].unflatten(vector))
+    except Exception as e:
+        metrics = None
+        # the message is written into a single CSV row
+        error = " ".join(str(e).split()) or type(e).__name__
+
+    tracer = tracing.get_tracer()
+    return idx, metrics, error, tracer.pop_events() if tracer is not None else []
+
+
+def read_checkpoint(output):
+    """
+    :return: the indices of all configurations in an existing output file, including the failed ones. An incomplete
+             last row, e.g. of an interrupted sweep, is removed from the file
+    """
+    if not os.path.isfile(output):
+        return set()
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    with open(output, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        return set(int(row["index"]) for row in reader
+                   if len(row) == len(reader.fieldnames) and None not in row.values())
+
+
+def run_sweep(ranges, method="lhs", n_samples=100, n_levels=3, seed=0, n_workers=1, output="sweep.csv",
+              filename="empty.cpacs3.xml", tracer=None):
+    """
+    runs a design space sweep and appends the results to a CSV file
+    :param ranges: an ordered list of (name, lower, upper) tuples
+    :param method: "lhs" for a latin hypercube sample or "factorial" for a full factorial sample
+    :param n_samples: the number of configurations of the latin hypercube sample
+    :param n_levels: the number of levels per parameter of the full factorial sample
+    :param seed: the random seed of the latin hypercube sample
+    :param n_workers: the number of worker processes
+    :param output: the CSV file. If it already exists, the sweep is resumed. Failed configurations are written with
+                   the status "failed" and their error message and are not evaluated again by a resumed sweep
+    :param filename: the empty cpacs file the airplane is generated in
+    :param tracer: optional tracing.Tracer collecting the trace events of all worker processes
+    """
+    names = [r[0] for r in ranges]
+    sample = create_sample(ranges, method, n_samples, n_levels, seed)
+
+    # the sweep definition is stored next to the output, to make sure a resumed sweep uses the same sample
+    definition = {"ranges": ranges, "method": method, "n_samples": n_samples, "n_levels": n_levels, "seed": seed}
+    definition_file = output + ".json"
+    if os.path.isfile(output) and os.path.isfile(definition_file):
+        with open(definition_file, "r") as f:
+            if json.load(f) != json.loads(json.dumps(definition)):
+                raise RuntimeError("%s belongs to a different sweep" % output)
+    with open(definition_file, "w") as f:
+        json.dump(definition, f, indent=4)
+
+    done = read_checkpoint(output)
+    tasks = [(idx, sample[idx]) for idx in range(sample.shape[0]) if idx not in done]
+    print("%d configurations, %d already evaluated" % (sample.shape[0], len(done)))
+    if not tasks:
+        return
+
+    schema_params = create_airplane.smooth_parameters_final
+    unknown = set(names) - set(parameter_schema.ParameterSchema(schema_params).names())
+    if unknown:
+        raise ValueError("Unknown parameters: " + ", ".join(sorted(unknown)))
+
+    base_document = create_base_document(filename)
+
+    write_header = not os.path.isfile(output) or os.path.getsize(output) == 0
+    with open(output, "a", newline="") as f:
+        writer = csv.DictWriter(f, ["index", "status", "error"] + names + metric_names())
+        if write_header:
+            writer.writeheader()
+        pool = multiprocessing.get_context("spawn").Pool(n_workers, initializer=init_worker,
+                                                         initargs=(base_document, names, tracer is not None))
+        try:
+            for n_done, (idx, metrics, error, events) in enumerate(pool.imap_unordered(evaluate_sample, tasks)):
+                if tracer is not None:
+                    tracer.add_events(events)
+                row = dict(zip(names, sample[idx]))
+                if metrics is None:
+                    print("Configuration %d failed: %s" % (idx, error))
+                    row.update(status="failed", error=error)
+                else:
+                    row.update(metrics)
+                    row["status"] = "ok"
+                row["index"] = idx
+                writer.writerow(row)
+
+                # every row is a checkpoint
+                f.flush()
+                if (n_done + 1) % 100 == 0:
+                    print("%d/%d configurations evaluated" % (n_done + 1, len(tasks)))
+        finally:
+            pool.close()
+            pool.join()
+
+
+def write_parquet(csv_file, parquet_file):
+    """
+    converts the results of a sweep to the parquet format (requires pandas and pyarrow)
+    """
+    import pandas
+    pandas.read_csv(csv_file).sort_values("index").to_parquet(parquet_file, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Design space sweep of the CPACSCreator airplane")
+    parser.add_argument("ranges", help="json file containing the ranges of the swept parameters")
+    parser.add_argument("--method", choices=["lhs", "factorial"], default="lhs", help="sampling method")
+    parser.add_argument("--samples", type=int, default=100, help="number of configurations of the lhs sample")
+    parser.add_argument("--levels", type=int, default=3, help="levels per parameter of the factorial sample")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the lhs sample")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="number of processes")
+    parser.add_argument("--output", default="sweep.csv", help="CSV output file")
+    parser.add_argument("--parquet", default=None, help="additionally write the results to this parquet file")
+    parser.add_argument("--trace", default=None, help="write a Chrome/Perfetto trace of all evaluations to this file")
+    args = parser.parse_args()
+
+    with open(args.ranges, "r") as f:
+        ranges = [(name, float(lower), float(upper)) for name, (lower, upper) in sorted(json.load(f).items())]
+
+    tracer = tracing.Tracer() if args.trace is not None else None
+
+    run_sweep(ranges, method=args.method, n_samples=args.samples, n_levels=args.levels, seed=args.seed,
+              n_workers=args.workers, output=args.output, tracer=tracer)
+
+    if tracer is not None:
+        tracer.write_chrome_trace(args.trace)
+        tracer.print_summary()
+
+    if args.parquet is not None:
+        write_parquet(args.output, args.parquet)
@@ -0,0 +1,210 @@
+"""
+Opt-in instrumentation of the geometry pipeline. Spans are recorded only after tracing was enabled:
+
+    import tracing
+
+    tracer = tracing.enable()
+    ...  # run the animation or sweep
+    tracer.write_chrome_trace("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+    tracer.print_summary()
+
+While tracing is disabled, span() and traced() cost a single function call.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+def peak_rss_kb():
+    """
+    :return: the peak resident set size of this process in kB, or None if it is not available
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kB, mac os reports bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _Span(object):
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.child_time = 0.
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        stack = self.tracer._stack()
+        stack.pop()
+        duration = end - self.start
+        if stack:
+            stack[-1].child_time += duration
+        self.tracer._record(self, duration)
+        return False
+
+
+class Tracer(object):
+    """
+    Records nested spans with their durations and the peak RSS of the process at the end of each span
+    """
+
+    def __init__(self):
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _record(self, span, duration):
+        args = dict(span.args)
+        args["max_rss_kb"] = peak_rss_kb()
+        args["self_us"] = (duration - span.child_time) * 1e6
+        event = {
+            "name": span.name,
+            "cat": "tigl",
+            "ph": "X",
+            # the monotonic clock is shared by all processes, hence the events of worker processes line up
+            "ts": span.start * 1e6,
+            "dur": duration * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.current_thread().ident,
+            "args": args
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name, **args):
+        """
+        :param name: the name of the span, e.g. "wing_main.get_loft"
+        :param args: additional values that are shown with the span in the trace viewer
+        :return: a context manager measuring the enclosed code
+        """
+        return _Span(self, name, args)
+
+    def pop_events(self):
+        """
+        removes and returns all recorded events, e.g. to pass them from a worker process to the main process
+        """
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def add_events(self, events):
+        """
+        adds events recorded by another tracer, e.g. in a worker process
+        """
+        with self._lock:
+            self.events.extend(events)
+
+    def write_chrome_trace(self, filename):
+        """
+        writes the recorded spans in the chrome trace event format, which can be opened with chrome://tracing or
+        https://ui.perfetto.dev
+        """
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """
+        :return: a list of dictionaries containing the number of calls, the total, self, mean and max time (in s)
+                 of each span name, sorted by total time
+        """
+        rows = {}
+        for event in self.events:
+            row = rows.setdefault(event["name"], {"name": event["name"], "calls": 0, "total": 0., "self": 0.,
+                                                  "max": 0.})
+            row["calls"] += 1
+            row["total"] += event["dur"] * 1e-6
+            row["self"] += event["args"]["self_us"] * 1e-6
+            row["max"] = max(row["max"], event["dur"] * 1e-6)
+        for row in rows.values():
+            row["mean"] = row["total"] / row["calls"]
+        return sorted(rows.values(), key=lambda row: row["total"], reverse=True)
+
+    def print_summary(self):
+        print("%-45s %8s %11s %11s %11s %11s" % ("span", "calls", "total [s]", "self [s]", "mean [s]", "max [s]"))
+        for row in self.summary():
+            print("%-45s %8d %11.4f %11.4f %11.4f %11.4f" % (row["name"], row["calls"], row["total"], row["self"],
+                                                             row["mean"], row["max"]))
+
+
+_tracer = None
+
+
+def enable(tracer=None):
+    """
+    enables tracing
+    :param tracer: the tracer recording the spans. If None, a new tracer is created
+    :return: the tracer
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer()
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer():
+    """
+    :return: the active tracer or None, if tracing is disabled
+    """
+    return _tracer
+
+
+def span(name, **args):
+    """
+    :return: a context manager measuring the enclosed code, if tracing is enabled
+    """
+    if _tracer is None:
+        return _NullSpan()
+    return _tracer.span(name, **args)
+
+
+def traced(name=None):
+    """
+    decorator that records a span for each call of the decorated function, if tracing is enabled
+    :param name: the name of the span. Defaults to the name of the function
+    """
+    def decorator(func):
+        span_name = name if name is not None else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
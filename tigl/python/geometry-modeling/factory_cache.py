@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+import numpy as np
+
+import tigl3.curve_factories
+import tigl3.surface_factories
+
+
+def _key(value, referenced):
+    """
+    creates a hashable key for an argument of a factory function. Arrays are hashed by their content, other objects
+    (e.g. curves) by their identity. Objects keyed by identity are collected in referenced, so that the cache can
+    keep them alive and their id is not reused.
+    """
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.shape, value.dtype.str, hashlib.sha1(np.ascontiguousarray(value).tobytes()).digest())
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_key(v, referenced) for v in value)
+    if isinstance(value, (int, float, str, bool, type(None))):
+        return value
+    referenced.append(value)
+    return ("id", id(value))
+
+
+class FactoryCache(object):
+    """
+    A bounded LRU cache around a curve or surface factory function. Calling the cache with the same points, parameters
+    and degree as before returns the previously created curve or surface.
+
+    Note that the cached results are shared between all callers and must not be modified.
+    """
+
+    def __init__(self, factory, maxsize=128):
+        """
+        :param factory: the factory function, e.g. tigl3.curve_factories.interpolate_points
+        :param maxsize: the maximum number of cached results
+        """
+        self.factory = factory
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        referenced = []
+        key = (_key(args, referenced), _key(sorted(kwargs.items()), referenced))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        result = self.factory(*args, **kwargs)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (result, referenced)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: a dictionary containing the number of hits, misses and evictions, the hit rate and the size
+        """
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / calls if calls > 0 else 0.,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+interpolate_points = FactoryCache(tigl3.curve_factories.interpolate_points, maxsize=256)
+interpolate_curves = FactoryCache(tigl3.surface_factories.interpolate_curves)
+interpolate_curve_network = FactoryCache(tigl3.surface_factories.interpolate_curve_network)
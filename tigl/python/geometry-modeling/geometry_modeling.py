@@ -1,21 +1,58 @@
-from ipywidgets import FloatSlider, HBox, VBox, Button, Accordion
-import tigl3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from ipywidgets import FloatSlider, HBox, VBox, Button, Accordion, Checkbox
+from tornado.ioloop import IOLoop
 from OCC.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakeEdge
 import numpy as np
 
-import tigl3.curve_factories
-import tigl3.surface_factories
+import factory_cache
+from progressive_display import ProgressiveDisplay
+
+
+def _make_edge(curve):
+    return BRepBuilderAPI_MakeEdge(curve).Edge()
+
+
+def _make_face(surface):
+    return BRepBuilderAPI_MakeFace(surface, 1e-6).Face()
+
+
+# the same curve or surface always results in the same edge or face, whose mesh can be reused by the renderer
+make_edge = factory_cache.FactoryCache(_make_edge)
+make_face = factory_cache.FactoryCache(_make_face)
+
+# (min, max, step) of the sliders of the wing animation, see also surface_atlas.py
+inner_range = (-0.3, 1., 0.01)
+outer_range = (-0.1, 1.3, 0.01)
+parameter_range = (0.3, 0.95, 0.01)
+
+# TiGL is not thread-safe, hence the demos call it on this single worker thread only. This includes the
+# interpolation of the curves, which would otherwise run on the kernel thread while a surface is computed
+tigl_executor = ThreadPoolExecutor(max_workers=1)
+
 
 class SurfaceModelingDemo(object):
 
-    def __init__(self):
+    def __init__(self, tracer=None, gordon_atlas=None, skinning_atlas=None):
+        # optional tracer recording the time of the geometry computations, e.g. tracing.Tracer from the
+        # cpacscreator-animation example
+        self.tracer = tracer
+
+        # optional precomputed surfaces of the wing animation, see surface_atlas.py
+        self.gordon_atlas = gordon_atlas
+        self.skinning_atlas = skinning_atlas
+
         # list of points on NACA2412 profile
         px = [1.000084, 0.975825, 0.905287, 0.795069, 0.655665, 0.500588, 0.34468, 0.203313, 0.091996, 0.022051, 0.0, 0.026892, 0.098987, 0.208902, 0.346303, 0.499412, 0.653352, 0.792716, 0.90373, 0.975232, 0.999916]
         py = [0.001257, 0.006231, 0.019752, 0.03826, 0.057302, 0.072381, 0.079198, 0.072947, 0.054325, 0.028152, 0.0, -0.023408, -0.037507, -0.042346, -0.039941, -0.033493, -0.0245, -0.015499, -0.008033, -0.003035, -0.001257]
 
-        self.points_c1 = np.array([pnt for pnt in zip(px, [0.]*len(px), py)]) * 2.
-        self.points_c2 = np.array([pnt for pnt in zip(px, [0]*len(px), py)])
-        self.points_c3 = np.array([pnt for pnt in zip(px, py, [0.]*len(px))]) * 0.2
+        px, py = np.array(px), np.array(py)
+        zeros = np.zeros_like(px)
+
+        self.points_c1 = np.column_stack([px, zeros, py]) * 2.
+        self.points_c2 = np.column_stack([px, zeros, py])
+        self.points_c3 = np.column_stack([px, py, zeros]) * 0.2
 
         # shift sections to their correct position
         # second curve at y = 7
@@ -45,18 +82,18 @@ class SurfaceModelingDemo(object):
         # lower trailing edge points
         self.te_lo_points = np.array([self.points_c1[-1,:], self.points_c2[-1,:], self.points_c3[-1,:]])
 
-        self.curve1 = tigl3.curve_factories.interpolate_points(self.points_c1)
-        self.curve2 = tigl3.curve_factories.interpolate_points(self.points_c2)
-        self.curve3 = tigl3.curve_factories.interpolate_points(self.points_c3)
+        # executor for the TiGL computations of the interactive demo
+        self.executor = tigl_executor
+        self._pending = None
+        self._request_id = 0
+        self._le_request_id = 0
+
+        self.executor.submit(self._interpolate_curves).result()
 
         self.profile_1_edge = BRepBuilderAPI_MakeEdge(self.curve1).Edge()
         self.profile_2_edge = BRepBuilderAPI_MakeEdge(self.curve2).Edge()
         self.profile_3_edge = BRepBuilderAPI_MakeEdge(self.curve3).Edge()
 
-        self.te_up = tigl3.curve_factories.interpolate_points(self.te_up_points)
-        self.le    = tigl3.curve_factories.interpolate_points(self.le_points)
-        self.te_lo = tigl3.curve_factories.interpolate_points(self.te_lo_points)
-
         self.te_up_edge = BRepBuilderAPI_MakeEdge(self.te_up).Edge()
         self.le_edge = BRepBuilderAPI_MakeEdge(self.le).Edge()
         self.te_lo_edge = BRepBuilderAPI_MakeEdge(self.te_lo).Edge()
@@ -64,17 +101,59 @@ class SurfaceModelingDemo(object):
         self.surface_skin = None
         self.gordon_surface = None
 
+        # the slider values (inner, outer) the leading edge was interpolated from by compute_le. The precomputed
+        # gordon surfaces use these leading edges, not the initial one
+        self.le_values = None
+
+        # shows the shapes of all renderers of the demo, see get_display
+        self._display = None
+
+    def _interpolate_curves(self):
+        self.curve1 = factory_cache.interpolate_points(self.points_c1)
+        self.curve2 = factory_cache.interpolate_points(self.points_c2)
+        self.curve3 = factory_cache.interpolate_points(self.points_c3)
+
+        self.te_up = factory_cache.interpolate_points(self.te_up_points)
+        self.le    = factory_cache.interpolate_points(self.le_points)
+        self.te_lo = factory_cache.interpolate_points(self.te_lo_points)
+
+    def get_display(self):
+        """
+        :return: the ProgressiveDisplay of the demo. It is shared by all renderers, so that the meshes of shapes that
+                 were shown before are reused
+        """
+        if self._display is None:
+            self._display = ProgressiveDisplay()
+        return self._display
+
+    def span(self, name):
+        if self.tracer is None:
+            # an empty ExitStack is a context manager doing nothing
+            return ExitStack()
+        return self.tracer.span(name)
+
+    def compute_le(self, le_points):
+        """
+        interpolates the leading edge, must be called on the executor
+        :return: the leading edge curve and its edge
+        """
+        with self.span("interpolate_points"):
+            le = factory_cache.interpolate_points(le_points, [0., 0.25, 0.55, 0.8, 1.0])
+        return le, make_edge(le)
+
     def get_updated_le(self):
-        self.le = tigl3.curve_factories.interpolate_points(self.le_points, [0., 0.25, 0.55, 0.8, 1.0])
-        return BRepBuilderAPI_MakeEdge(self.le).Edge()
+        self.le, le_edge = self.executor.submit(self.compute_le, self.le_points.copy()).result()
+        self.le_values = (self.le_points[1, 0], self.le_points[2, 0])
+        return le_edge
 
     def show_profiles(self, renderer):
+        display = self.get_display()
         renderer.DisplayPoints(self.points_c1, name='p1', size=5, color="red", update=False)
         renderer.DisplayPoints(self.points_c2, name='p2', size=5, color="red", update=False)
         renderer.DisplayPoints(self.points_c3, name='p3', size=5, color="red", update=False)
-        renderer.DisplayShape(self.profile_1_edge, update=False, shape_color='#2cd342', quality=0.05)
-        renderer.DisplayShape(self.profile_2_edge, update=False, shape_color='#2cd342', quality=0.05)
-        renderer.DisplayShape(self.profile_3_edge, update=False, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.profile_1_edge, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.profile_2_edge, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.profile_3_edge, shape_color='#2cd342', quality=0.05)
         renderer._camera.fov=9.
         return renderer
 
@@ -82,29 +161,42 @@ class SurfaceModelingDemo(object):
         if self.gordon_surface is not None:
             return self.gordon_surface
         
-        s = tigl3.surface_factories.interpolate_curve_network([self.curve1, self.curve2, self.curve3], [self.te_up, self.le, self.te_lo])
-        self.gordon_surface = BRepBuilderAPI_MakeFace(s, 1e-6).Face()
-        return self.surface_skin      
+        self.gordon_surface = self.executor.submit(self.compute_gordon_surface, [self.curve1, self.curve2, self.curve3],
+                                                   [self.te_up, self.le, self.te_lo]).result()
+        return self.gordon_surface
 
     def get_skinned_surface(self):
         if self.surface_skin is not None:
             return self.surface_skin
         
-        s = tigl3.surface_factories.interpolate_curves([self.curve1, self.curve2, self.curve3])
+        s = self.executor.submit(factory_cache.interpolate_curves, [self.curve1, self.curve2, self.curve3]).result()
         self.surface_skin = BRepBuilderAPI_MakeFace(s, 1e-6).Face()
         return self.surface_skin
 
 
-    def show_wing_animation(self, renderer):
+    def compute_gordon_surface(self, profiles, guides):
+        with self.span("interpolate_curve_network"):
+            surface = factory_cache.interpolate_curve_network(profiles, guides)
+        with self.span("BRepBuilderAPI_MakeFace"):
+            return make_face(surface)
 
+    def compute_skinned_surface(self, profiles, skinning_parm):
+        with self.span("interpolate_curves"):
+            surface = factory_cache.interpolate_curves(profiles, [0., skinning_parm, 1.0])
+        with self.span("BRepBuilderAPI_MakeFace"):
+            return make_face(surface)
+
+    def show_wing_animation(self, renderer):
+        # shapes are displayed with a coarse mesh first, which is refined in the background
+        display = self.get_display()
 
         renderer.DisplayPoints(self.le_points[1:3], name='lepoints', size=15, color="blue", update=False)
-        renderer.DisplayShape(self.profile_1_edge, update=False, shape_color='#2cd342', quality=0.05)
-        renderer.DisplayShape(self.profile_2_edge, update=False, shape_color='#2cd342', quality=0.05)
-        renderer.DisplayShape(self.profile_3_edge, update=False, shape_color='#2cd342', quality=0.05)
-        renderer.DisplayShape(self.te_up_edge, update=False, shape_color='blue', quality=0.1, render_edges=False)
-        renderer.DisplayShape(self.le_edge, update=False, shape_color='blue', quality=0.1, render_edges=False)
-        renderer.DisplayShape(self.te_lo_edge, update=False, shape_color='blue', quality=0.1, render_edges=False)
+        display.display(renderer, self.profile_1_edge, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.profile_2_edge, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.profile_3_edge, shape_color='#2cd342', quality=0.05)
+        display.display(renderer, self.te_up_edge, shape_color='blue', quality=0.1, render_edges=False)
+        display.display(renderer, self.le_edge, shape_color='blue', quality=0.1, render_edges=False)
+        display.display(renderer, self.te_lo_edge, shape_color='blue', quality=0.1, render_edges=False)
         renderer._camera.fov=9.
 
         def update(change):
@@ -112,71 +204,127 @@ class SurfaceModelingDemo(object):
             self.le_points[2, 0] = v2_slider.value
             renderer.EraseObject('lepoints', update=False)
             renderer.DisplayPoints(self.le_points[1:3], name='lepoints', size=15, color="blue", update=False)
+            renderer.Update()
 
-            le_edge_new = self.get_updated_le()
-            renderer.DisplayShape(le_edge_new, quality=0.1, update=False, shape_color="blue")
-            renderer.EraseShape(self.le_edge)
+            self._le_request_id += 1
+            request_id = self._le_request_id
+            le_values = (self.le_points[1, 0], self.le_points[2, 0])
+            future = self.executor.submit(self.compute_le, self.le_points.copy())
+            future.add_done_callback(lambda f: io_loop.add_callback(apply_le, request_id, le_values, f))
+
+        # the leading edge and the surfaces are computed on the executor, so that the widgets stay responsive.
+        # Results are applied to the renderer on the event loop of the kernel, and only if no newer request was made
+        # meanwhile
+        io_loop = IOLoop.current()
+
+        def apply_le(request_id, le_values, future):
+            if request_id != self._le_request_id:
+                return
+            self.le, le_edge_new = future.result()
+            self.le_values = le_values
+            display.erase(renderer, self.le_edge)
+            display.display(renderer, le_edge_new, quality=0.1, shape_color="blue")
             self.le_edge = le_edge_new
-            
             renderer.Update()
 
-        def show_gordon_surface(b):
-            b.disabled = True
-            b.description = "... surface"
-
-
-            surface = tigl3.surface_factories.interpolate_curve_network([self.curve1, self.curve2, self.curve3],
-                                                                    [self.te_up, self.le, self.te_lo])
-            wing_new = BRepBuilderAPI_MakeFace(surface, 1e-6).Face()
+            if live_checkbox.value:
+                show_gordon_surface(button)
 
-            b.disabled = False
-            b.description = "... display"
-            b.disabled = True
-            renderer.DisplayShape(wing_new, shape_color='#0070a8', transparency=True, opacity=0.4, quality=0.2, update=False)
+        def display_surface(surface_new):
+            # the old surfaces are erased first, as the new surface might be one of them
             if self.gordon_surface is not None:
-                renderer.EraseShape(self.gordon_surface, update=False)
+                display.erase(renderer, self.gordon_surface)
             if self.surface_skin is not None:
-                renderer.EraseShape(self.surface_skin, update=False)
+                display.erase(renderer, self.surface_skin)
+            with self.span("DisplayShape"):
+                display.display(renderer, surface_new, shape_color='#0070a8', transparency=True, opacity=0.4,
+                                quality=0.2)
             renderer.Update()
+
+        def apply_gordon_surface(wing_new):
+            display_surface(wing_new)
             self.gordon_surface = wing_new
-            b.disabled = False
-            b.description = "Compute"
 
-        def show_skinned_surface(b):
-            b.disabled = True
+        def apply_skinned_surface(surface_skin_new):
+            display_surface(surface_skin_new)
+            self.surface_skin = surface_skin_new
+
+        def apply_result(request_id, future, apply):
+            if future.cancelled() or request_id != self._request_id:
+                # superseded by a newer request
+                return
+            for b in [button, button2]:
+                b.description = "Compute"
+            apply(future.result())
+
+        def submit(b, apply, compute, *args):
+            self._request_id += 1
+            request_id = self._request_id
+            if self._pending is not None:
+                self._pending.cancel()
+
             b.description = "... surface"
+            self._pending = self.executor.submit(compute, *args)
+            self._pending.add_done_callback(
+                lambda future: io_loop.add_callback(apply_result, request_id, future, apply))
+
+        def apply_precomputed(atlas, apply, *values):
+            surface = atlas.surface(*values) if atlas is not None else None
+            if surface is None:
+                return False
+            # supersedes a pending computation
+            self._request_id += 1
+            for b in [button, button2]:
+                b.description = "Compute"
+            with self.span("SurfaceAtlas.surface"):
+                apply(make_face(surface))
+            return True
+
+        def show_gordon_surface(b):
+            # the atlas is looked up with the leading edge points the current leading edge was interpolated from
+            if self.le_values is not None and apply_precomputed(self.gordon_atlas, apply_gordon_surface,
+                                                                *self.le_values):
+                return
+            submit(b, apply_gordon_surface, self.compute_gordon_surface,
+                   [self.curve1, self.curve2, self.curve3], [self.te_up, self.le, self.te_lo])
+
+        def show_skinned_surface(b):
             self.skinning_parm = par_slider.value
-            s = tigl3.surface_factories.interpolate_curves([self.curve1, self.curve2, self.curve3], [0., self.skinning_parm, 1.0])
-            surface_skin_new = BRepBuilderAPI_MakeFace(s, 1e-6).Face()
+            if apply_precomputed(self.skinning_atlas, apply_skinned_surface, self.skinning_parm):
+                return
+            submit(b, apply_skinned_surface, self.compute_skinned_surface,
+                   [self.curve1, self.curve2, self.curve3], self.skinning_parm)
+
+        def update_skinning(change):
+            if live_checkbox.value:
+                show_skinned_surface(button2)
+
+        def set_live_update(change):
+            # while live updates are enabled, the surfaces are recomputed while dragging the sliders
+            for slider in [v1_slider, v2_slider, par_slider]:
+                slider.continuous_update = live_checkbox.value
 
-            b.disabled = False
-            b.description = "... display"
-            b.disabled = True
-            renderer.DisplayShape(surface_skin_new, shape_color='#0070a8', transparency=True, opacity=0.4, quality=0.2, update=False)
-            if self.gordon_surface is not None:
-                renderer.EraseShape(self.gordon_surface, update=False)
-            if self.surface_skin is not None:
-                renderer.EraseShape(self.surface_skin, update=False)
-            renderer.Update()
-            self.surface_skin = surface_skin_new
-            b.disabled = False
-            b.description = "Compute"
-        
-        
         button = Button(description="Compute")
         button.on_click(show_gordon_surface)
         button2 = Button(description="Compute")
         button2.on_click(show_skinned_surface)
 
-        v1_slider, v2_slider = (FloatSlider(description='inner', min=-0.3, max=1., step=0.01, value=0.3,
+        v1_slider, v2_slider = (FloatSlider(description='inner', min=inner_range[0], max=inner_range[1],
+                                                    step=inner_range[2], value=0.3,
                                                     continuous_update=False, orientation='horizontal'),
-                                FloatSlider(description='outer', min=-0.1, max=1.3, step=0.01, value=0.3,
+                                FloatSlider(description='outer', min=outer_range[0], max=outer_range[1],
+                                                    step=outer_range[2], value=0.3,
                                                     continuous_update=False, orientation='horizontal'))
 
-        par_slider = FloatSlider(description='Parameter', min=0.3, max=0.95, step=0.01, value=self.skinning_parm,
-                                                    continuous_update=False, orientation='horizontal')
+        par_slider = FloatSlider(description='Parameter', min=parameter_range[0], max=parameter_range[1],
+                                 step=parameter_range[2], value=self.skinning_parm,
+                                 continuous_update=False, orientation='horizontal')
+        live_checkbox = Checkbox(value=False, description='Live update')
+
         v1_slider.observe(update, names=['value'])
         v2_slider.observe(update, names=['value'])
+        par_slider.observe(update_skinning, names=['value'])
+        live_checkbox.observe(set_live_update, names=['value'])
         
 
         gordon_widget = VBox([v2_slider, v1_slider, button])
@@ -189,4 +337,4 @@ class SurfaceModelingDemo(object):
         accordion.set_title(1, 'Skinning Surface')
         accordion
 
-        return HBox([renderer._renderer, accordion])
\ No newline at end of file
+        return HBox([renderer._renderer, VBox([accordion, live_checkbox])])
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Loads the point lists of all profiles (airfoils, fuselage profiles, ...) of a CPACS file in a single pass:
+
+    profiles = load_profiles("../../../cpacs/simpletest.cpacs.xml")
+    points = profiles.points("NACA0012")      # array of shape (n, 3)
+    curve = profiles.curve("NACA0012")        # B-spline interpolating the points
+
+The point lists of guide curve profiles (rX, rY, rZ) are read as well. Their points are relative to the start and end
+point of the guide curve, see ProfileLibrary.is_relative.
+"""
+
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+def _tag(element):
+    # removes the namespace, if there is one
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def parse_vector(text):
+    """
+    :param text: a CPACS vector, e.g. "0.0;0.5;1.0"
+    :return: the values as numpy array
+    """
+    return np.fromstring(text.strip().strip(";"), sep=";")
+
+
+class ProfileLibrary(object):
+    """
+    The point lists of all profiles of a CPACS file. The points of all profiles are stored in one contiguous array,
+    the points of a single profile are a view of it.
+    """
+
+    def __init__(self, uids, all_points, offsets, relative=(), skipped=()):
+        """
+        :param uids: the uids of the profiles
+        :param all_points: the points of all profiles as array of shape (n, 3)
+        :param offsets: the points of the i-th profile are all_points[offsets[i]:offsets[i + 1]]
+        :param relative: the uids of the guide curve profiles, whose points are relative coordinates (rX, rY, rZ)
+        :param skipped: the uids of the profiles whose point lists could not be read
+        """
+        self.uids = list(uids)
+        self.all_points = all_points
+        self.offsets = offsets
+        self.relative = set(relative)
+        self.skipped = list(skipped)
+        self._index = dict((uid, i) for i, uid in enumerate(self.uids))
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, uid):
+        return uid in self._index
+
+    def points(self, uid):
+        """
+        :return: the points of a profile as array of shape (n, 3)
+        """
+        i = self._index[uid]
+        return self.all_points[self.offsets[i]:self.offsets[i + 1]]
+
+    def is_relative(self, uid):
+        """
+        :return: True for a guide curve profile, whose points are relative to the start and end point of the guide
+                 curve instead of absolute coordinates
+        """
+        return uid in self.relative
+
+    def curve(self, uid, parameters=None, degree=3):
+        """
+        :return: a B-spline curve interpolating the points of a profile, see tigl3.curve_factories.interpolate_points
+        """
+        import factory_cache
+
+        return factory_cache.interpolate_points(self.points(uid), parameters, degree)
+
+
+def read_profiles(filename):
+    """
+    reads the point lists of all profiles of a CPACS file. Point lists that have neither x, y, z nor rX, rY, rZ vectors
+    are skipped and reported by the skipped uids of the library
+    :return: a ProfileLibrary
+    """
+    uids = []
+    relative = []
+    skipped = []
+    columns = {"x": [], "y": [], "z": []}
+
+    # the uids of the enclosing elements, the profile is the parent of the point list
+    stack = []
+    for event, element in ET.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            stack.append(element.get("uID"))
+            continue
+        stack.pop()
+
+        if _tag(element) != "pointList" or not stack or stack[-1] is None:
+            continue
+
+        vectors = dict((_tag(child), child) for child in element)
+        for names in [("x", "y", "z"), ("rX", "rY", "rZ")]:
+            if all(name in vectors and vectors[name].get("mapType") == "vector" for name in names):
+                break
+        else:
+            skipped.append(stack[-1])
+            element.clear()
+            continue
+        values = [parse_vector(vectors[name].text or "") for name in names]
+        if len(set(len(v) for v in values)) != 1:
+            raise ValueError("The coordinates of the profile '%s' differ in length" % stack[-1])
+
+        uids.append(stack[-1])
+        if names[0] == "rX":
+            relative.append(stack[-1])
+        for name, v in zip("xyz", values):
+            columns[name].append(v)
+        element.clear()
+
+    if not uids:
+        return ProfileLibrary([], np.empty((0, 3)), np.zeros(1, dtype=int), skipped=skipped)
+
+    # a single copy of all coordinates into the contiguous array
+    points = np.column_stack([np.concatenate(columns[name]) for name in "xyz"])
+    offsets = np.cumsum([0] + [len(x) for x in columns["x"]])
+    return ProfileLibrary(uids, points, offsets, relative, skipped)
+
+
+# (absolute path, modification time) -> ProfileLibrary
+_libraries = {}
+
+
+def load_profiles(filename):
+    """
+    returns the profiles of a CPACS file. The profiles are read only once, unless the file was modified
+    :return: a ProfileLibrary
+    """
+    path = os.path.abspath(filename)
+    key = (path, os.path.getmtime(filename))
+    if key not in _libraries:
+        for old_key in [k for k in _libraries if k[0] == path]:
+            del _libraries[old_key]
+        _libraries[key] = read_profiles(filename)
+    return _libraries[key]
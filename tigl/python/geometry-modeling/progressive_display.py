@@ -0,0 +1,183 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+
+import numpy as np
+from OCC.Bnd import Bnd_Box
+from OCC.BRepBndLib import brepbndlib_Add
+from OCC.TopAbs import TopAbs_EDGE, TopAbs_WIRE, TopAbs_VERTEX
+from tornado.ioloop import IOLoop
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "..", "internal-api-utils"))
+
+import mesh_export
+
+
+def mesh_deflection(shape, quality):
+    """
+    :return: the linear and angular deflection the JupyterRenderer tessellates a shape with for a given quality. As
+             in the Tesselator of pythonocc, the linear deflection is relative to the size of the bounding box
+    """
+    box = Bnd_Box()
+    brepbndlib_Add(shape, box)
+    xmin, ymin, zmin, xmax, ymax, zmax = box.Get()
+    return max(xmax - xmin, ymax - ymin, zmax - zmin) * 1e-2 * quality, 0.5 * quality
+
+
+def tessellate(shape, quality):
+    """
+    :return: the MeshBuffers of a shape for a quality of the JupyterRenderer, see mesh_deflection
+    """
+    deflection, angular_deflection = mesh_deflection(shape, quality)
+    return mesh_export.triangulate(shape, deflection=deflection, angular_deflection=angular_deflection)
+
+
+# the shape color of the JupyterRenderer
+default_color = "#a6a6a6"
+
+
+class ProgressiveDisplay(object):
+    """
+    Displays shapes in JupyterRenderers with a coarse mesh first and refines them to the requested quality in the
+    background, so that the coarse mesh reaches the browser without waiting for the fine mesh.
+
+    Faces, shells and solids are tessellated by this class instead of the renderer: the coarse mesh on the event loop
+    of the kernel, the fine mesh on a worker thread. The mesh buffers are cached by shape and quality and are passed
+    to the renderer as pythreejs meshes, see mesh_export.to_pythreejs. Hence, displaying a shape again, e.g. a surface
+    that was shown before, shows its fine mesh at once. Edges, wires and vertices are displayed by the renderer itself,
+    as their discretization does not depend on the quality.
+    """
+
+    def __init__(self, coarse_factor=5., maxsize=64, io_loop=None, executor=None):
+        """
+        :param coarse_factor: the quality of the coarse mesh is the requested quality times this factor
+        :param maxsize: the maximum number of cached meshes
+        :param io_loop: the event loop the renderers are updated on. Defaults to the event loop of the kernel
+        :param executor: the executor the fine meshes are computed on. Defaults to a single worker thread
+        """
+        self.coarse_factor = coarse_factor
+        self.maxsize = maxsize
+        self.io_loop = io_loop if io_loop is not None else IOLoop.current()
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.hits = 0
+        self.misses = 0
+        # (hash, quality) -> list of (shape, MeshBuffers)
+        self._meshes = OrderedDict()
+        # list of (shape, quality) whose fine mesh is being computed
+        self._pending = []
+        # list of [renderer, shape, pythreejs group or None, material, quality, refined] of the displayed shapes.
+        # The group is None for shapes displayed by the renderer itself
+        self._displayed = []
+
+    def _find(self, renderer, shape):
+        for entry in self._displayed:
+            if entry[0] is renderer and entry[1].IsSame(shape):
+                return entry
+        return None
+
+    def _key(self, shape, quality):
+        return shape.HashCode(2**31 - 1), quality
+
+    def _cached(self, shape, quality):
+        key = self._key(shape, quality)
+        for s, mesh in self._meshes.get(key, []):
+            if s.IsSame(shape):
+                self._meshes.move_to_end(key)
+                return mesh
+        return None
+
+    def _store(self, shape, quality, mesh):
+        self._meshes.setdefault(self._key(shape, quality), []).append((shape, mesh))
+        while len(self._meshes) > self.maxsize:
+            self._meshes.popitem(last=False)
+
+    def _add(self, renderer, mesh, material):
+        group = mesh_export.to_pythreejs([(mesh, [np.eye(4)])], **material)
+        renderer._displayed_non_pickable_objects.add(group)
+        return group
+
+    def display(self, renderer, shape, quality=1.0, update=False, **kwargs):
+        """
+        displays a shape, first with a coarse mesh
+        :param renderer: the JupyterRenderer
+        :param shape: the shape to display
+        :param quality: the quality of the final mesh, as in JupyterRenderer.DisplayShape. Smaller is finer
+        :param update: if True, the renderer is updated after the coarse mesh was added
+        :param kwargs: further arguments of JupyterRenderer.DisplayShape, e.g. shape_color. Of faces, shells and
+                       solids only shape_color, transparency and opacity are used
+        """
+        if self._find(renderer, shape) is not None:
+            return
+
+        if shape.ShapeType() in [TopAbs_EDGE, TopAbs_WIRE, TopAbs_VERTEX]:
+            renderer.DisplayShape(shape, quality=quality, update=update, **kwargs)
+            self._displayed.append([renderer, shape, None, None, quality, True])
+            return
+
+        material = {"color": kwargs.get("shape_color", default_color)}
+        if kwargs.get("transparency", False):
+            material.update(transparent=True, opacity=kwargs.get("opacity", 1.))
+
+        mesh = self._cached(shape, quality)
+        refined = mesh is not None
+        if refined:
+            self.hits += 1
+        else:
+            self.misses += 1
+            coarse_quality = quality * self.coarse_factor
+            mesh = self._cached(shape, coarse_quality)
+            if mesh is None:
+                mesh = tessellate(shape, coarse_quality)
+                self._store(shape, coarse_quality, mesh)
+
+            if not any(s.IsSame(shape) and q == quality for s, q in self._pending):
+                self._pending.append((shape, quality))
+                future = self.executor.submit(tessellate, shape, quality)
+                future.add_done_callback(lambda f: self.io_loop.add_callback(self._refine, shape, quality, f))
+
+        self._displayed.append([renderer, shape, self._add(renderer, mesh, material), material, quality, refined])
+        if update:
+            renderer.Update()
+
+    def _refine(self, shape, quality, future):
+        """
+        stores the fine mesh of a shape and replaces the coarse mesh of all renderers displaying it on the event loop
+        """
+        self._pending = [(s, q) for s, q in self._pending if not (s is shape and q == quality)]
+        if future.cancelled() or future.exception() is not None:
+            # the shape stays displayed with its coarse mesh
+            return
+        mesh = future.result()
+        self._store(shape, quality, mesh)
+
+        for entry in self._displayed:
+            renderer, s, group, material, q, refined = entry
+            if refined or q != quality or not s.IsSame(shape):
+                continue
+            renderer._displayed_non_pickable_objects.remove(group)
+            entry[2] = self._add(renderer, mesh, material)
+            entry[5] = True
+            renderer.Update()
+
+    def erase(self, renderer, shape, update=False):
+        """
+        removes a shape from a renderer. Its meshes stay in the cache
+        """
+        entry = self._find(renderer, shape)
+        if entry is None:
+            return
+        self._displayed = [e for e in self._displayed if e is not entry]
+        if entry[2] is None:
+            renderer.EraseShape(shape, update=update)
+            return
+        renderer._displayed_non_pickable_objects.remove(entry[2])
+        if update:
+            renderer.Update()
+
+    def clear(self):
+        """
+        empties the mesh cache, shapes are displayed with a coarse mesh first again
+        """
+        self._meshes.clear()
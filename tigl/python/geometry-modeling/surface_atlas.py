@@ -0,0 +1,278 @@
+"""
+Precomputes the surfaces of the interactive demo for every position of its sliders, so that the demo only has to look
+up a surface instead of computing it. The B-spline surfaces are stored as memory-mapped numpy files:
+
+    python surface_atlas.py gordon atlas/gordon --workers 8
+    python surface_atlas.py skinning atlas/skinning
+
+and used by passing the directories to the demo:
+
+    demo = SurfaceModelingDemo(gordon_atlas=SurfaceAtlas("atlas/gordon"),
+                               skinning_atlas=SurfaceAtlas("atlas/skinning"))
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+import tigl3.surface_factories
+from OCC.Geom import Geom_BSplineSurface
+from OCC.TColgp import TColgp_Array2OfPnt
+from OCC.TColStd import TColStd_Array1OfInteger, TColStd_Array1OfReal, TColStd_Array2OfReal
+from OCC.gp import gp_Pnt
+
+import factory_cache
+
+
+def axis_values(axis):
+    """
+    :param axis: a tuple (min, max, step) of a slider
+    :return: all values of the slider
+    """
+    lower, upper, step = axis
+    n = int(round((upper - lower) / step)) + 1
+    return np.round(lower + step * np.arange(n), 10)
+
+
+def _object(handle):
+    return handle.GetObject() if hasattr(handle, "GetObject") else handle
+
+
+def _handle(surface):
+    return surface.GetHandle() if hasattr(surface, "GetHandle") else surface
+
+
+def surface_to_arrays(surface):
+    """
+    :param surface: a B-spline surface as returned by the tigl3 surface factories
+    :return: a dictionary containing the poles, weights, knots, multiplicities and the degrees of the surface
+    """
+    s = _object(surface)
+    nu, nv = s.NbUPoles(), s.NbVPoles()
+    poles = np.empty((nu, nv, 3))
+    weights = np.empty((nu, nv))
+    for i in range(nu):
+        for j in range(nv):
+            p = s.Pole(i + 1, j + 1)
+            poles[i, j] = p.X(), p.Y(), p.Z()
+            weights[i, j] = s.Weight(i + 1, j + 1)
+
+    return {
+        "poles": poles,
+        "weights": weights,
+        "uknots": np.array([s.UKnot(i) for i in range(1, s.NbUKnots() + 1)]),
+        "vknots": np.array([s.VKnot(i) for i in range(1, s.NbVKnots() + 1)]),
+        "umults": np.array([s.UMultiplicity(i) for i in range(1, s.NbUKnots() + 1)], dtype=np.int32),
+        "vmults": np.array([s.VMultiplicity(i) for i in range(1, s.NbVKnots() + 1)], dtype=np.int32),
+        "udegree": s.UDegree(),
+        "vdegree": s.VDegree(),
+        "uperiodic": s.IsUPeriodic(),
+        "vperiodic": s.IsVPeriodic()
+    }
+
+
+def _array1(values, array_type):
+    result = array_type(1, len(values))
+    for i, v in enumerate(values):
+        result.SetValue(i + 1, v)
+    return result
+
+
+def arrays_to_surface(poles, weights, uknots, vknots, umults, vmults, udegree, vdegree, uperiodic, vperiodic):
+    """
+    :return: a handle to the B-spline surface defined by the arrays, see surface_to_arrays
+    """
+    nu, nv = poles.shape[:2]
+    occ_poles = TColgp_Array2OfPnt(1, nu, 1, nv)
+    occ_weights = TColStd_Array2OfReal(1, nu, 1, nv)
+    for i in range(nu):
+        for j in range(nv):
+            occ_poles.SetValue(i + 1, j + 1, gp_Pnt(*poles[i, j]))
+            occ_weights.SetValue(i + 1, j + 1, float(weights[i, j]))
+
+    surface = Geom_BSplineSurface(occ_poles, occ_weights,
+                                  _array1([float(k) for k in uknots], TColStd_Array1OfReal),
+                                  _array1([float(k) for k in vknots], TColStd_Array1OfReal),
+                                  _array1([int(m) for m in umults], TColStd_Array1OfInteger),
+                                  _array1([int(m) for m in vmults], TColStd_Array1OfInteger),
+                                  int(udegree), int(vdegree), bool(uperiodic), bool(vperiodic))
+    return _handle(surface)
+
+
+# the arrays of a surface, which are stored in one memory-mapped file each
+array_names = ["poles", "weights", "uknots", "vknots", "umults", "vmults"]
+
+# the values of a surface, which are the same for the whole atlas and are stored in the metadata
+meta_names = ["udegree", "vdegree", "uperiodic", "vperiodic"]
+
+
+# state of a worker process, see init_worker
+_worker = {}
+
+
+def init_worker():
+    from geometry_modeling import SurfaceModelingDemo
+    _worker["demo"] = SurfaceModelingDemo()
+
+
+def compute_surface(kind, values):
+    """
+    computes the surface of the demo for a slider position
+    :param kind: "gordon" or "skinning"
+    :param values: the slider values, i.e. (inner, outer) for the gordon surface and (parameter,) for the skinning
+    """
+    demo = _worker["demo"]
+    profiles = [demo.curve1, demo.curve2, demo.curve3]
+    if kind == "gordon":
+        demo.le_points[1, 0], demo.le_points[2, 0] = values
+        demo.get_updated_le()
+        return tigl3.surface_factories.interpolate_curve_network(profiles, [demo.te_up, demo.le, demo.te_lo])
+    elif kind == "skinning":
+        return tigl3.surface_factories.interpolate_curves(profiles, [0., values[0], 1.])
+    raise ValueError("Invalid surface kind '%s'" % kind)
+
+
+def compute_row(args):
+    """
+    computes the surfaces of several slider positions in a worker process
+    :param args: a tuple (kind, list of (flat index, slider values))
+    :return: a list of (flat index, arrays). arrays is None, if the surface could not be computed
+    """
+    kind, positions = args
+    results = []
+    for idx, values in positions:
+        try:
+            results.append((idx, surface_to_arrays(compute_surface(kind, values))))
+        except Exception as e:
+            print("Surface %s at %s failed: %s" % (kind, values, e))
+            results.append((idx, None))
+    return results
+
+
+def build_atlas(kind, directory, n_workers=1):
+    """
+    computes the surfaces of all slider positions and stores them in a directory
+    :param kind: "gordon" or "skinning"
+    :param directory: the output directory
+    :param n_workers: the number of worker processes
+    """
+    from geometry_modeling import inner_range, outer_range, parameter_range
+
+    axes = {"gordon": [inner_range, outer_range], "skinning": [parameter_range]}[kind]
+    values = [axis_values(axis) for axis in axes]
+    shape = tuple(len(v) for v in values)
+
+    # each task computes several positions along the last axis
+    grid = list(np.ndindex(*shape))
+    row_length = max(1, min(shape[-1], len(grid) // (4 * n_workers)))
+    tasks = []
+    for start in range(0, len(grid), row_length):
+        positions = [(int(np.ravel_multi_index(index, shape)), tuple(float(v[i]) for v, i in zip(values, index)))
+                     for index in grid[start:start + row_length]]
+        tasks.append((kind, positions))
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    arrays = None
+    meta = None
+    valid = np.zeros(shape, dtype=bool)
+    pool = multiprocessing.get_context("spawn").Pool(n_workers, initializer=init_worker)
+    try:
+        for n_done, results in enumerate(pool.imap_unordered(compute_row, tasks)):
+            for idx, surface in results:
+                if surface is None:
+                    continue
+                if arrays is None:
+                    # the size of the arrays is known after the first surface was computed
+                    meta = dict((name, surface[name]) for name in meta_names)
+                    arrays = dict((name, np.lib.format.open_memmap(
+                        os.path.join(directory, name + ".npy"), mode="w+", dtype=surface[name].dtype,
+                        shape=shape + surface[name].shape)) for name in array_names)
+                if any(arrays[name].shape[len(shape):] != surface[name].shape for name in array_names) or \
+                        any(meta[name] != surface[name] for name in meta_names):
+                    raise RuntimeError("The surfaces of the atlas do not share the same structure")
+
+                index = np.unravel_index(idx, shape)
+                for name in array_names:
+                    arrays[name][index] = surface[name]
+                valid[index] = True
+            print("%d/%d rows computed" % (n_done + 1, len(tasks)))
+    finally:
+        pool.close()
+        pool.join()
+
+    if arrays is None:
+        raise RuntimeError("No surface could be computed")
+    for array in arrays.values():
+        array.flush()
+    np.save(os.path.join(directory, "valid.npy"), valid)
+
+    meta["kind"] = kind
+    meta["axes"] = [list(axis) for axis in axes]
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+
+
+class SurfaceAtlas(object):
+    """
+    Looks up precomputed surfaces, see build_atlas. The arrays are memory-mapped, hence only the surfaces which are
+    looked up are read from disk.
+    """
+
+    def __init__(self, directory, maxsize=64):
+        """
+        :param directory: the directory of the atlas
+        :param maxsize: the number of surfaces kept in memory, so that a surface looked up again is the same object
+        """
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.axes = [tuple(axis) for axis in self.meta["axes"]]
+        self.values = [axis_values(axis) for axis in self.axes]
+        self.arrays = dict((name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+                           for name in array_names)
+        self.valid = np.load(os.path.join(directory, "valid.npy"))
+        self._surfaces = factory_cache.FactoryCache(self._build_surface, maxsize)
+
+    def index(self, *values):
+        """
+        :return: the grid index of the slider values or None, if they are not on the grid of the atlas
+        """
+        if len(values) != len(self.axes):
+            return None
+        index = []
+        for value, (lower, upper, step), axis in zip(values, self.axes, self.values):
+            i = int(round((value - lower) / step))
+            if i < 0 or i >= len(axis) or abs(axis[i] - value) > 1e-3 * step:
+                return None
+            index.append(i)
+        index = tuple(index)
+        return index if self.valid[index] else None
+
+    def surface(self, *values):
+        """
+        :param values: the slider values
+        :return: the precomputed B-spline surface or None, if the atlas does not contain it
+        """
+        return self._surfaces(*[float(v) for v in values])
+
+    def _build_surface(self, *values):
+        index = self.index(*values)
+        if index is None:
+            return None
+        kwargs = dict((name, self.arrays[name][index]) for name in array_names)
+        kwargs.update((name, self.meta[name]) for name in meta_names)
+        return arrays_to_surface(**kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputes the surfaces of the geometry modeling demo")
+    parser.add_argument("kind", choices=["gordon", "skinning"], help="the surface to precompute")
+    parser.add_argument("directory", help="output directory of the atlas")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="number of processes")
+    args = parser.parse_args()
+
+    build_atlas(args.kind, args.directory, args.workers)
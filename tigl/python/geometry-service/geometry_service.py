@@ -0,0 +1,538 @@
+"""
+A long-running local service keeping a pool of opened CPACS configurations. Scripts and notebooks send their requests
+to the service instead of opening TiXI and TiGL themselves, hence the configurations and their lofts are built only
+once:
+
+    python geometry_service.py --port 8642
+    python geometry_service.py --socket /tmp/tigl.sock
+
+All requests are POST requests with a json body, e.g.
+
+    curl -d '{"file": "/path/to/CPACS_30_D150.xml", "uid": "D150_VAMP_W1"}' localhost:8642/bbox
+
+See README.md for the available requests.
+"""
+
+import argparse
+from collections import OrderedDict
+import http.client
+import http.server
+import json
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+import tigl3.configuration
+import tigl3.geometry
+import tigl3.tigl3wrapper
+import tixi3.tixi3wrapper
+
+from OCC.BRepTools import breptools_Write
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "..", "cpacscreator-animation"))
+
+import bounding_boxes
+
+# TiGL and TiXI are not thread safe, hence all calls into them are serialized. Requests processed at the same time
+# only overlap in receiving the request and sending the response
+tigl_lock = threading.RLock()
+
+
+class Configuration(object):
+    """
+    An opened CPACS configuration of the pool
+    """
+
+    def __init__(self, key, tixi_h, tigl_h):
+        self.key = key
+        self.tixi_h = tixi_h
+        self.tigl_h = tigl_h
+        mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+        self.aircraft = mgr.get_configuration(tigl_h._handle.value)
+        self.bbox_cache = bounding_boxes.BoundingBoxCache(self.aircraft)
+        # only one request at a time may use a configuration, e.g. a parameter set must not change it meanwhile
+        self.lock = threading.Lock()
+        self.users = 0
+
+    def component(self, uid):
+        return self.aircraft.get_uidmanager().get_geometric_component(uid)
+
+    def component_uids(self):
+        """
+        :return: the uids of all wings and fuselages
+        """
+        uids = [self.aircraft.get_fuselage(i).get_uid() for i in range(1, self.aircraft.get_fuselage_count() + 1)]
+        uids += [self.aircraft.get_wing(i).get_uid() for i in range(1, self.aircraft.get_wing_count() + 1)]
+        return uids
+
+    def warm(self):
+        """
+        builds the lofts of all wings and fuselages, which are cached by TiGL afterwards
+        """
+        for uid in self.component_uids():
+            self.component(uid).get_loft()
+
+    def close(self):
+        with tigl_lock:
+            self.tigl_h.close()
+            self.tixi_h.close()
+
+
+def _argument(value):
+    # points are given as {"x": .., "y": .., "z": ..}
+    if isinstance(value, dict):
+        return tigl3.geometry.CTiglPoint(value["x"], value["y"], value["z"])
+    return value
+
+
+def apply_parameters(aircraft, parameters):
+    """
+    calls setters of the wings and fuselages of a configuration
+    :param parameters: a list of dictionaries {"uid": .., "method": .., "args": [..]}, e.g.
+                       {"uid": "wing_main", "method": "set_sweep", "args": [20]}. Points are given as
+                       {"x": .., "y": .., "z": ..}. Only the methods set_* and scale can be called.
+    """
+    wings = aircraft.get_wings()
+    fuselages = aircraft.get_fuselages()
+    for parameter in parameters:
+        uid = parameter["uid"]
+        method = parameter["method"]
+        if not (method.startswith("set_") or method == "scale"):
+            raise ValueError("Invalid method '%s'" % method)
+        component = None
+        for get_component in [wings.get_wing, fuselages.get_fuselage]:
+            try:
+                component = get_component(uid)
+                break
+            except RuntimeError:
+                # TiGL raises an error, if there is no such component
+                pass
+        if component is None:
+            raise KeyError("Unknown wing or fuselage '%s'" % uid)
+        getattr(component, method)(*[_argument(a) for a in parameter.get("args", [])])
+
+
+class ConfigurationPool(object):
+    """
+    Keeps the most recently used configurations opened. Configurations are identified by the path and the
+    modification time of their file and an optional parameter set, see apply_parameters.
+    """
+
+    def __init__(self, max_configurations=8, warm=False):
+        """
+        :param max_configurations: the number of configurations kept opened. If more configurations are requested,
+                                   the least recently used configuration is closed
+        :param warm: if True, the lofts of a configuration are built when it is opened
+        """
+        self.max_configurations = max_configurations
+        self.warm = warm
+        self._configurations = OrderedDict()
+        # key -> threading.Event of the configurations being opened
+        self._opening = {}
+        # looking up configurations is serialized. Configurations are opened and closed without holding this lock,
+        # as opening a configuration may take long
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(filename, parameters=None):
+        path = os.path.abspath(filename)
+        parameter_key = json.dumps(parameters, sort_keys=True) if parameters else None
+        return path, os.path.getmtime(path), parameter_key
+
+    def _open(self, key, parameters):
+        tixi_h = tixi3.tixi3wrapper.Tixi3()
+        if parameters:
+            # the parameters are applied to a copy of the unmodified configuration, which must not be used by another
+            # request while it is copied
+            base = self._acquire(key[:2] + (None,), None)
+            try:
+                with tigl_lock:
+                    document = base.tixi_h.exportDocumentAsString()
+            finally:
+                self.release(base)
+
+        with tigl_lock:
+            if parameters:
+                tixi_h.openString(document)
+            else:
+                tixi_h.open(key[0])
+            tigl_h = tigl3.tigl3wrapper.Tigl3()
+            tigl_h.open(tixi_h, "")
+
+            configuration = Configuration(key, tixi_h, tigl_h)
+            if parameters:
+                apply_parameters(configuration.aircraft, parameters)
+            if self.warm:
+                configuration.warm()
+        return configuration
+
+    def _evict(self, keep=None):
+        """
+        removes the least recently used configurations from the pool. Called with the lock of the pool held
+        :return: the removed configurations, which have to be closed by the caller
+        """
+        unused = [key for key, c in self._configurations.items() if c.users == 0 and key != keep]
+        removed = []
+        while len(self._configurations) > self.max_configurations and unused:
+            removed.append(self._configurations.pop(unused.pop(0)))
+        return removed
+
+    def _acquire(self, key, parameters):
+        while True:
+            with self._lock:
+                configuration = self._configurations.get(key)
+                if configuration is not None:
+                    self.hits += 1
+                    self._configurations.move_to_end(key)
+                    configuration.users += 1
+                    break
+                opening = self._opening.get(key)
+                if opening is None:
+                    self.misses += 1
+                    self._opening[key] = threading.Event()
+
+            if opening is not None:
+                # another request is opening the configuration
+                opening.wait()
+                continue
+
+            try:
+                configuration = self._open(key, parameters)
+            finally:
+                with self._lock:
+                    self._opening.pop(key).set()
+            with self._lock:
+                self._configurations[key] = configuration
+                configuration.users += 1
+                removed = self._evict(keep=key)
+            for c in removed:
+                c.close()
+            break
+
+        configuration.lock.acquire()
+        return configuration
+
+    def acquire(self, filename, parameters=None):
+        """
+        returns an opened configuration, which is locked for the caller until it is released
+        :param filename: the cpacs file
+        :param parameters: an optional parameter set, see apply_parameters
+        """
+        return self._acquire(self.key(filename, parameters), parameters)
+
+    def release(self, configuration):
+        configuration.lock.release()
+        with self._lock:
+            configuration.users -= 1
+            removed = self._evict()
+        for c in removed:
+            c.close()
+
+    def status(self):
+        with self._lock:
+            return {
+                "configurations": [{"file": key[0], "parameters": json.loads(key[2]) if key[2] else None,
+                                    "users": c.users} for key, c in self._configurations.items()],
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def close(self):
+        with self._lock:
+            for configuration in self._configurations.values():
+                configuration.close()
+            self._configurations.clear()
+
+
+def _read_file(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def handle_loft(configuration, request):
+    """
+    :return: the loft of a component in the BRep format
+    """
+    component = configuration.component(request["uid"])
+    loft = component.get_mirrored_loft() if request.get("mirrored", False) else component.get_loft()
+    if loft is None:
+        raise ValueError("'%s' has no mirrored loft" % request["uid"])
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, "loft.brep")
+        breptools_Write(loft.shape(), filename)
+        return _read_file(filename), "application/octet-stream"
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def handle_bbox(configuration, request):
+    """
+    :return: the bounding boxes of some or all components
+    """
+    uids = request["uids"] if "uids" in request else [request["uid"]] if "uid" in request \
+        else configuration.component_uids()
+    boxes = configuration.bbox_cache.get_all(uids, request.get("mode"))
+    return json.dumps(dict((uid, list(box)) for uid, box in boxes.items())).encode("utf-8"), "application/json"
+
+
+def handle_export(configuration, request):
+    """
+    :return: the whole configuration exported as STEP, IGES or STL
+    """
+    fmt = request.get("format", "step").lower()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, "export." + fmt)
+        if fmt == "step":
+            configuration.tigl_h.exportSTEP(filename)
+        elif fmt == "iges":
+            configuration.tigl_h.exportIGES(filename)
+        elif fmt == "stl":
+            configuration.tigl_h.exportMeshedGeometrySTL(filename, request.get("deflection", 0.01))
+        else:
+            raise ValueError("Invalid export format '%s'" % fmt)
+        return _read_file(filename), "application/octet-stream"
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def handle_apply(configuration, request):
+    """
+    opens the configuration with the parameter set of the request and returns its components. Following requests
+    with the same file and parameters use this configuration
+    """
+    return json.dumps({"components": configuration.component_uids()}).encode("utf-8"), "application/json"
+
+
+handlers = {
+    "/loft": handle_loft,
+    "/bbox": handle_bbox,
+    "/export": handle_export,
+    "/apply": handle_apply
+}
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def address_string(self):
+        # the client address of a unix socket is not a tuple
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_message(self, status, message):
+        self.send(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send(200, json.dumps(self.server.pool.status()).encode("utf-8"))
+        else:
+            self.send_error_message(404, "Unknown request %s" % self.path)
+
+    def do_POST(self):
+        handler = handlers.get(self.path)
+        if handler is None:
+            self.send_error_message(404, "Unknown request %s" % self.path)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            filename = request["file"]
+        except (ValueError, KeyError) as e:
+            self.send_error_message(400, "Invalid request: %s" % e)
+            return
+
+        with self.server.requests:
+            try:
+                configuration = self.server.pool.acquire(filename, request.get("parameters"))
+            except (OSError, ValueError, KeyError) as e:
+                self.send_error_message(400, "Could not open %s: %s" % (filename, e))
+                return
+            except Exception as e:
+                self.send_error_message(500, "Could not open %s: %s" % (filename, e))
+                return
+
+            try:
+                with tigl_lock:
+                    body, content_type = handler(configuration, request)
+            except (ValueError, KeyError) as e:
+                self.send_error_message(400, str(e))
+                return
+            except Exception as e:
+                self.send_error_message(500, str(e))
+                return
+            finally:
+                self.server.pool.release(configuration)
+        self.send(200, body, content_type)
+
+
+class _ServiceMixIn(socketserver.ThreadingMixIn):
+    daemon_threads = True
+
+    def init_service(self, pool, max_requests):
+        self.pool = pool
+        # limits the number of requests processed at the same time
+        self.requests = threading.BoundedSemaphore(max_requests)
+
+
+class HTTPService(_ServiceMixIn, http.server.HTTPServer):
+    pass
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixService(_ServiceMixIn, socketserver.UnixStreamServer):
+        pass
+
+
+def serve(pool, host="127.0.0.1", port=8642, socket_file=None, max_requests=2):
+    """
+    runs the service until it is interrupted
+    :param pool: the ConfigurationPool
+    :param socket_file: if given, the service listens on this unix socket instead of host and port
+    :param max_requests: the number of requests processed at the same time. The calls into TiGL are serialized,
+                         see tigl_lock
+    """
+    if socket_file is not None:
+        if os.path.exists(socket_file):
+            os.remove(socket_file)
+        server = UnixService(socket_file, RequestHandler)
+    else:
+        server = HTTPService((host, port), RequestHandler)
+    server.init_service(pool, max_requests)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        if socket_file is not None and os.path.exists(socket_file):
+            os.remove(socket_file)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_file):
+        http.client.HTTPConnection.__init__(self, "localhost")
+        self.socket_file = socket_file
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_file)
+
+
+class GeometryServiceClient(object):
+    """
+    A client of the service, e.g. for use in a notebook:
+
+        client = GeometryServiceClient(port=8642)
+        client.bbox("../../../cpacs/CPACS_30_D150.xml", uid="D150_VAMP_W1")
+    """
+
+    def __init__(self, host="127.0.0.1", port=8642, socket_file=None):
+        self.host = host
+        self.port = port
+        self.socket_file = socket_file
+
+    def _connection(self):
+        if self.socket_file is not None:
+            return _UnixHTTPConnection(self.socket_file)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def request(self, endpoint, filename, **kwargs):
+        """
+        sends a request to the service
+        :param endpoint: "loft", "bbox", "export" or "apply"
+        :param filename: the cpacs file. Relative paths are relative to the current directory of the client
+        :return: the response, which is decoded if it is json
+        """
+        kwargs["file"] = os.path.abspath(filename)
+        connection = self._connection()
+        try:
+            connection.request("POST", "/" + endpoint, json.dumps(kwargs), {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            body = response.read()
+            is_json = response.getheader("Content-Type") == "application/json"
+            if response.status != 200:
+                raise RuntimeError(json.loads(body.decode("utf-8"))["error"] if is_json else body)
+            return json.loads(body.decode("utf-8")) if is_json else body
+        finally:
+            connection.close()
+
+    def loft(self, filename, uid, mirrored=False, parameters=None):
+        """
+        :return: the loft of a component as TopoDS_Shape
+        """
+        from OCC.BRep import BRep_Builder
+        from OCC.BRepTools import breptools_Read
+        from OCC.TopoDS import TopoDS_Shape
+
+        data = self.request("loft", filename, uid=uid, mirrored=mirrored, parameters=parameters)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            brep_file = os.path.join(tmp_dir, "loft.brep")
+            with open(brep_file, "wb") as f:
+                f.write(data)
+            shape = TopoDS_Shape()
+            breptools_Read(shape, brep_file, BRep_Builder())
+            return shape
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def bbox(self, filename, uid=None, mode=None, parameters=None):
+        """
+        :return: a dictionary mapping each component uid to its bounding box (xmin, ymin, zmin, xmax, ymax, zmax)
+        """
+        kwargs = {"mode": mode, "parameters": parameters}
+        if uid is not None:
+            kwargs["uid"] = uid
+        return self.request("bbox", filename, **kwargs)
+
+    def export(self, filename, output, fmt="step", parameters=None):
+        """
+        exports the configuration to the file output
+        """
+        with open(output, "wb") as f:
+            f.write(self.request("export", filename, format=fmt, parameters=parameters))
+
+    def apply(self, filename, parameters):
+        """
+        opens the configuration with a parameter set, see apply_parameters
+        :return: the uids of the components
+        """
+        return self.request("apply", filename, parameters=parameters)["components"]
+
+    def status(self):
+        connection = self._connection()
+        try:
+            connection.request("GET", "/status")
+            return json.loads(connection.getresponse().read().decode("utf-8"))
+        finally:
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local service keeping a pool of opened CPACS configurations")
+    parser.add_argument("--host", default="127.0.0.1", help="host the service listens on")
+    parser.add_argument("--port", type=int, default=8642, help="port the service listens on")
+    parser.add_argument("--socket", default=None, help="listen on this unix socket instead of host and port")
+    parser.add_argument("--configurations", type=int, default=8, help="number of configurations kept opened")
+    parser.add_argument("--requests", type=int, default=2, help="number of requests processed at the same time")
+    parser.add_argument("--warm", action="store_true", help="build all lofts when a configuration is opened")
+    args = parser.parse_args()
+
+    serve(ConfigurationPool(args.configurations, args.warm), args.host, args.port, args.socket, args.requests)
@@ -0,0 +1,93 @@
+"""
+Cuts many tool shapes (e.g. doors, access panels or spar holes) from a shape with a single boolean operation:
+
+    from tigl3.geometry import CNamedShape
+
+    tools = [CNamedShape(box, "Door%d" % i) for i, box in enumerate(boxes)]
+    cut_component(wing, tools)
+
+Tools, whose bounding box does not touch the bounding box of the shape, are discarded before the cut. The remaining
+tools are fused into one tool, hence the cut runs only once instead of once per tool. The tools are fused rather
+than collected in a compound, as the cut with a compound of overlapping tools may fail or be wrong.
+"""
+
+from OCC.BRepBndLib import brepbndlib_Add
+from OCC.Bnd import Bnd_Box
+
+from tigl3.boolean_ops import CCutShape, CFuseShapes
+
+
+def _bounding_box(shape, tolerance):
+    bbox = Bnd_Box()
+    brepbndlib_Add(shape, bbox)
+    bbox.Enlarge(tolerance)
+    return bbox
+
+
+def filter_tools(target, tools, tolerance=1e-6):
+    """
+    :param target: a CNamedShape
+    :param tools: a list of CNamedShape
+    :param tolerance: the bounding boxes are enlarged by this value
+    :return: the tools whose bounding box touches the bounding box of the target
+    """
+    target_box = _bounding_box(target.shape(), tolerance)
+    return [tool for tool in tools if not target_box.IsOut(_bounding_box(tool.shape(), tolerance))]
+
+
+def unique_tools(tools):
+    """
+    :param tools: a list of CNamedShape
+    :return: the tools in their order, without the tools whose shape is the same as the shape of a previous tool
+    """
+    unique = {}
+    result = []
+    for tool in tools:
+        same_hash = unique.setdefault(tool.shape().HashCode(2**31 - 1), [])
+        if not any(tool.shape().IsSame(other.shape()) for other in same_hash):
+            same_hash.append(tool)
+            result.append(tool)
+    return result
+
+
+def combine_tools(tools, name="Cutouts"):
+    """
+    fuses several tools into a single named shape. The tools may overlap. The faces keep the names of their tools
+    :param tools: a list of CNamedShape
+    :return: a CNamedShape of the union of all tools
+    """
+    tools = unique_tools(tools)
+    if len(tools) == 1:
+        return tools[0]
+    combined = CFuseShapes(tools[0], tools[1:]).named_shape()
+    combined.set_name(name)
+    return combined
+
+
+def batch_cut(target, tools, tolerance=1e-6):
+    """
+    cuts all tools from the target with a single boolean operation
+    :param target: a CNamedShape, e.g. the loft of a wing
+    :param tools: a list of CNamedShape
+    :param tolerance: the tolerance of the bounding box test
+    :return: the resulting CNamedShape. The faces keep the names of the target and the tools
+    """
+    return _cut(target, filter_tools(target, tools, tolerance))
+
+
+def _cut(target, tools):
+    if not tools:
+        return target
+    return CCutShape(target, combine_tools(tools)).named_shape()
+
+
+def cut_component(component, tools, tolerance=1e-6):
+    """
+    cuts all tools from the loft of a geometric component, e.g. a wing, and replaces its loft by the result
+    :return: the number of tools, which intersect the bounding box of the loft
+    """
+    loft = component.get_loft()
+    tools = filter_tools(loft, tools, tolerance)
+    if tools:
+        loft.Set(_cut(loft, tools))
+    return len(tools)
@@ -0,0 +1,258 @@
+"""
+Exports the wings and fuselages of a configuration to STEP in parallel and merges them into a single file. The
+translated components are cached by their geometry, hence exporting a configuration again only translates the
+components that changed:
+
+    export_configuration("../../../cpacs/CPACS_30_D150.xml", "D150.stp", cache_dir="export_cache", n_workers=4)
+
+The named shapes of the internal API (e.g. lofts or a CNamedShape) can be exported with the same cache:
+
+    export_shapes([wing.get_loft(), CNamedShape(box, "MyBox")], "ex1.stp", cache_dir="export_cache")
+
+Only STEP is supported, as the translated components are merged on the level of STEP entities. The merged file is
+not an assembly: it contains the products of all components side by side, without a root product referencing them.
+Other components of the configuration, e.g. engines or the far field, are not exported.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+
+import tigl3.configuration
+import tigl3.tigl3wrapper
+import tixi3.tixi3wrapper
+from tigl3.exports import create_exporter
+
+from OCC.BRepTools import breptools_Write
+from OCC.Interface import Interface_Static_IVal, Interface_Static_RVal, Interface_Static_SetIVal, \
+    Interface_Static_SetRVal
+
+
+def shape_key(named_shape, tolerance):
+    """
+    :return: a hash of the geometry and the face names of a named shape and the export tolerance
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, "shape.brep")
+        breptools_Write(named_shape.shape(), filename)
+        with open(filename, "rb") as f:
+            h = hashlib.sha1(f.read())
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    h.update(named_shape.name().encode("utf-8"))
+    for i in range(named_shape.get_face_count()):
+        h.update(b"\0" + named_shape.get_face_traits(i).name().encode("utf-8"))
+    h.update(("%r" % tolerance).encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_step(named_shape, filename, tolerance):
+    """
+    translates a single named shape to STEP
+    """
+    # user defined precision of the STEP writer. The settings are global, hence they are restored afterwards
+    mode = Interface_Static_IVal("write.precision.mode")
+    value = Interface_Static_RVal("write.precision.val")
+    Interface_Static_SetIVal("write.precision.mode", 2)
+    Interface_Static_SetRVal("write.precision.val", tolerance)
+    try:
+        exporter = create_exporter("stp")
+        exporter.add_shape(named_shape)
+        exporter.write(filename)
+    finally:
+        Interface_Static_SetIVal("write.precision.mode", mode)
+        Interface_Static_SetRVal("write.precision.val", value)
+
+
+def export_cached(named_shape, tolerance, cache_dir):
+    """
+    translates a named shape to STEP, unless the cache already contains it
+    :return: the STEP file of the shape in the cache and whether it was found in the cache
+    """
+    filename = os.path.join(cache_dir, shape_key(named_shape, tolerance) + ".stp")
+    if os.path.isfile(filename):
+        return filename, True
+
+    # the file is moved to the cache when it is complete, so that other processes never read a partial file
+    fd, tmp_file = tempfile.mkstemp(suffix=".stp", dir=cache_dir)
+    os.close(fd)
+    try:
+        write_step(named_shape, tmp_file, tolerance)
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return filename, False
+
+
+# strings and entity references of a STEP file
+_step_token = re.compile(r"'(?:[^']|'')*'|#(\d+)")
+
+
+def _renumber(data, offset):
+    def replace(m):
+        return "#%d" % (int(m.group(1)) + offset) if m.group(1) is not None else m.group(0)
+
+    return _step_token.sub(replace, data)
+
+
+def _max_entity(data):
+    ids = [int(m.group(1)) for m in _step_token.finditer(data) if m.group(1) is not None]
+    return max(ids) if ids else 0
+
+
+def merge_step_files(filenames, output):
+    """
+    merges several STEP files into one file containing all of their products. The entities of each file are
+    renumbered, the header is taken from the first file. The products are not put into an assembly, each of them
+    stays a top-level product
+    """
+    if not filenames:
+        raise ValueError("No STEP files to merge")
+
+    header = None
+    sections = []
+    offset = 0
+    for filename in filenames:
+        with open(filename, "r") as f:
+            content = f.read()
+        start = content.index("DATA;") + len("DATA;")
+        end = content.rindex("ENDSEC;")
+        if header is None:
+            header = content[:start]
+        data = content[start:end]
+        sections.append(_renumber(data, offset))
+        offset += _max_entity(data)
+
+    with open(output, "w") as f:
+        f.write(header + "\n")
+        for data in sections:
+            f.write(data.strip("\n") + "\n")
+        f.write("ENDSEC;\nEND-ISO-10303-21;\n")
+
+
+def export_shapes(named_shapes, output, tolerance=0.001, cache_dir=None):
+    """
+    exports named shapes of the current process into a single STEP file
+    :param named_shapes: a list of CNamedShape, e.g. lofts
+    :param cache_dir: the directory of the export cache. If None, a temporary directory is used
+    :return: the number of shapes found in the cache
+    """
+    if not named_shapes:
+        raise ValueError("No shapes to export")
+
+    tmp_cache = cache_dir is None
+    if tmp_cache:
+        cache_dir = tempfile.mkdtemp()
+    elif not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    try:
+        results = [export_cached(shape, tolerance, cache_dir) for shape in named_shapes]
+        merge_step_files([filename for filename, cached in results], output)
+        return sum(1 for filename, cached in results if cached)
+    finally:
+        if tmp_cache:
+            shutil.rmtree(cache_dir)
+
+
+# state of a worker process, see init_worker
+_worker = {}
+
+
+def init_worker(document, tolerance, cache_dir):
+    tixi_h = tixi3.tixi3wrapper.Tixi3()
+    tixi_h.openString(document)
+    tigl_h = tigl3.tigl3wrapper.Tigl3()
+    tigl_h.open(tixi_h, "")
+    mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+    # the handles have to be kept alive as long as the configuration is used
+    _worker["handles"] = (tixi_h, tigl_h)
+    _worker["aircraft"] = mgr.get_configuration(tigl_h._handle.value)
+    _worker["tolerance"] = tolerance
+    _worker["cache_dir"] = cache_dir
+
+
+def export_component(args):
+    """
+    builds the loft of a component and translates it to STEP in a worker process
+    :param args: a tuple (uid, mirrored)
+    :return: a tuple (uid, mirrored, STEP file in the cache, whether it was found in the cache). The file is None,
+             if a mirrored loft was requested for a component without symmetry
+    """
+    uid, mirrored = args
+    component = _worker["aircraft"].get_uidmanager().get_geometric_component(uid)
+    loft = component.get_mirrored_loft() if mirrored else component.get_loft()
+    if loft is None:
+        return uid, mirrored, None, False
+    filename, cached = export_cached(loft, _worker["tolerance"], _worker["cache_dir"])
+    return uid, mirrored, filename, cached
+
+
+def configuration_components(filename, apply_symmetries=True):
+    """
+    :return: the document of a cpacs file and a list of (uid, mirrored) of its wings and fuselages
+    """
+    tixi_h = tixi3.tixi3wrapper.Tixi3()
+    tixi_h.open(filename)
+    tigl_h = tigl3.tigl3wrapper.Tigl3()
+    tigl_h.open(tixi_h, "")
+    try:
+        mgr = tigl3.configuration.CCPACSConfigurationManager_get_instance()
+        aircraft = mgr.get_configuration(tigl_h._handle.value)
+        components = [aircraft.get_fuselage(i) for i in range(1, aircraft.get_fuselage_count() + 1)]
+        components += [aircraft.get_wing(i) for i in range(1, aircraft.get_wing_count() + 1)]
+
+        tasks = [(component.get_uid(), False) for component in components]
+        if apply_symmetries:
+            tasks += [(component.get_uid(), True) for component in components]
+        return tixi_h.exportDocumentAsString(), tasks
+    finally:
+        tigl_h.close()
+        tixi_h.close()
+
+
+def export_configuration(filename, output, tolerance=0.001, apply_symmetries=True, cache_dir=None,
+                         n_workers=multiprocessing.cpu_count()):
+    """
+    exports the wings and fuselages of a configuration into a single STEP file, see merge_step_files. The
+    components are built and translated by several processes
+    :param filename: the cpacs file
+    :param output: the STEP file
+    :param tolerance: the precision of the STEP writer
+    :param apply_symmetries: if True, the mirrored components are exported as well
+    :param cache_dir: the directory of the export cache. If None, a temporary directory is used
+    :param n_workers: the number of worker processes
+    :return: the number of components found in the cache
+    """
+    document, tasks = configuration_components(filename, apply_symmetries)
+    if not tasks:
+        raise ValueError("%s contains no wings or fuselages to export" % filename)
+
+    tmp_cache = cache_dir is None
+    if tmp_cache:
+        cache_dir = tempfile.mkdtemp()
+    elif not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    try:
+        pool = multiprocessing.get_context("spawn").Pool(min(n_workers, len(tasks)), initializer=init_worker,
+                                                         initargs=(document, tolerance, cache_dir))
+        try:
+            # imap keeps the order of the components
+            results = list(pool.imap(export_component, tasks))
+        finally:
+            pool.close()
+            pool.join()
+
+        step_files = [step_file for uid, mirrored, step_file, cached in results if step_file is not None]
+        merge_step_files(step_files, output)
+        return sum(1 for result in results if result[3])
+    finally:
+        if tmp_cache:
+            shutil.rmtree(cache_dir)
@@ -0,0 +1,240 @@
+"""
+Tessellates the lofts of a configuration into packed numpy vertex and index buffers. Mirrored components are not
+tessellated twice, their mirrored loft is an instance of the same buffers with a mirror transformation:
+
+    instances = configuration_meshes(aircraft)   # list of (MeshBuffers, list of 4x4 matrices)
+
+    write_glb(instances, "D150.glb")             # binary glTF
+    write_stl(instances, "D150.stl")             # binary STL
+    renderer = JupyterRenderer()
+    add_to_renderer(renderer, instances)         # pythreejs meshes sharing the buffers
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+import tigl3.geometry
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "..", "cpacscreator-animation"))
+
+import headless_renderer
+
+
+class MeshBuffers(object):
+    """
+    A triangle mesh as contiguous arrays: vertices and normals of shape (n, 3) and type float32, triangles of shape
+    (m, 3) and type uint32
+    """
+
+    def __init__(self, vertices, normals, triangles, name=""):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.uint32)
+        self.name = name
+
+    def __len__(self):
+        return len(self.triangles)
+
+
+def triangulate(shape, name="", deflection=0.01, angular_deflection=0.5):
+    """
+    tessellates a shape, see headless_renderer.triangulate. The normals are smooth within a face and sharp at the
+    edges between faces
+    :param shape: a TopoDS_Shape, e.g. loft.shape()
+    :return: the MeshBuffers of the shape
+    """
+    vertices, triangles = headless_renderer.triangulate(shape, deflection, angular_deflection)
+    return MeshBuffers(vertices, headless_renderer.vertex_normals(vertices, triangles), triangles, name)
+
+
+def mirror_matrix(symmetry_axis):
+    """
+    :param symmetry_axis: the symmetry of a component, e.g. tigl3.geometry.TIGL_X_Z_PLANE
+    :return: the 4x4 matrix mirroring at the symmetry plane, or None if the component has no symmetry
+    """
+    scales = {
+        tigl3.geometry.TIGL_X_Y_PLANE: (1., 1., -1.),
+        tigl3.geometry.TIGL_X_Z_PLANE: (1., -1., 1.),
+        tigl3.geometry.TIGL_Y_Z_PLANE: (-1., 1., 1.),
+    }
+    if symmetry_axis not in scales:
+        return None
+    return np.diag(scales[symmetry_axis] + (1.,))
+
+
+def component_mesh(component, deflection=0.01):
+    """
+    tessellates the loft of a geometric component
+    :param component: e.g. a wing or a fuselage
+    :return: a tuple (MeshBuffers, matrices). matrices contains the identity and, for components with a symmetry,
+             the mirror transformation of the mirrored loft
+    """
+    mesh = triangulate(component.get_loft().shape(), component.get_uid(), deflection)
+    matrices = [np.eye(4)]
+    mirror = mirror_matrix(component.get_symmetry_axis())
+    if mirror is not None:
+        matrices.append(mirror)
+    return mesh, matrices
+
+
+def configuration_meshes(aircraft, deflection=0.01):
+    """
+    tessellates the wings and fuselages of a configuration
+    :param aircraft: a CCPACSConfiguration
+    :return: a list of (MeshBuffers, matrices), see component_mesh
+    """
+    components = [aircraft.get_fuselage(i) for i in range(1, aircraft.get_fuselage_count() + 1)]
+    components += [aircraft.get_wing(i) for i in range(1, aircraft.get_wing_count() + 1)]
+    return [component_mesh(component, deflection) for component in components]
+
+
+def to_pythreejs(instances, color="#d4a84b", **material):
+    """
+    creates pythreejs meshes. The buffers of a mesh are passed to pythreejs as they are and are sent to the browser
+    only once, even if the mesh is instanced several times
+    :param instances: a list of (MeshBuffers, matrices)
+    :param material: further arguments of the MeshPhongMaterial, e.g. transparent and opacity
+    :return: a pythreejs Group containing all instances
+    """
+    import pythreejs
+
+    material = pythreejs.MeshPhongMaterial(color=color, side="DoubleSide", **material)
+    group = pythreejs.Group()
+    for mesh, matrices in instances:
+        if len(mesh) == 0:
+            continue
+        geometry = pythreejs.BufferGeometry(attributes={
+            "position": pythreejs.BufferAttribute(array=mesh.vertices, normalized=False),
+            "normal": pythreejs.BufferAttribute(array=mesh.normals, normalized=False),
+            "index": pythreejs.BufferAttribute(array=mesh.triangles.ravel(), normalized=False),
+        })
+        for matrix in matrices:
+            # three.js expects the matrix in column-major order
+            group.add(pythreejs.Mesh(geometry=geometry, material=material, name=mesh.name,
+                                     matrixAutoUpdate=False, matrix=tuple(np.asarray(matrix).T.ravel())))
+    return group
+
+
+def add_to_renderer(renderer, instances, color="#d4a84b"):
+    """
+    displays the meshes in a JupyterRenderer, in place of calling renderer.DisplayShape for each loft
+    :return: the pythreejs Group of the meshes, which can be removed from the renderer again
+    """
+    group = to_pythreejs(instances, color)
+    renderer._displayed_non_pickable_objects.add(group)
+    return group
+
+
+def _padded(data, fill):
+    return data + fill * (-len(data) % 4)
+
+
+def write_glb(instances, filename, color=(0.83, 0.66, 0.29), y_up=True):
+    """
+    writes the meshes into a binary glTF file. Each mesh is stored once and referenced by a node per instance
+    :param instances: a list of (MeshBuffers, matrices)
+    :param color: the base color of the material
+    :param y_up: if True, the z axis of the configuration points upwards in glTF viewers, which use the y axis
+    """
+    binary = []
+    offset = 0
+    gltf = {
+        "asset": {"version": "2.0", "generator": "tigl-examples mesh_export"},
+        "buffers": [],
+        "bufferViews": [],
+        "accessors": [],
+        "meshes": [],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": list(color) + [1.],
+                                                "metallicFactor": 0., "roughnessFactor": 0.8},
+                       "doubleSided": True}],
+        "nodes": [],
+    }
+
+    def add_view(array, target):
+        nonlocal offset
+        data = array.tobytes()
+        binary.append(data)
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": offset, "byteLength": len(data), "target": target})
+        offset += len(data)
+        return len(gltf["bufferViews"]) - 1
+
+    instance_nodes = []
+    for mesh, matrices in instances:
+        if len(mesh) == 0:
+            continue
+        accessors = gltf["accessors"]
+        accessors.append({"bufferView": add_view(mesh.vertices, 34962), "componentType": 5126,
+                          "count": len(mesh.vertices), "type": "VEC3",
+                          "min": mesh.vertices.min(axis=0).tolist(), "max": mesh.vertices.max(axis=0).tolist()})
+        accessors.append({"bufferView": add_view(mesh.normals, 34962), "componentType": 5126,
+                          "count": len(mesh.normals), "type": "VEC3"})
+        accessors.append({"bufferView": add_view(mesh.triangles, 34963), "componentType": 5125,
+                          "count": mesh.triangles.size, "type": "SCALAR"})
+        n = len(accessors)
+        gltf["meshes"].append({"name": mesh.name, "primitives": [
+            {"attributes": {"POSITION": n - 3, "NORMAL": n - 2}, "indices": n - 1, "material": 0}]})
+
+        for matrix in matrices:
+            node = {"name": mesh.name, "mesh": len(gltf["meshes"]) - 1}
+            if not np.allclose(matrix, np.eye(4)):
+                node["matrix"] = np.asarray(matrix, dtype=float).T.ravel().tolist()
+            gltf["nodes"].append(node)
+            instance_nodes.append(len(gltf["nodes"]) - 1)
+
+    if y_up:
+        rotation = np.array([[1., 0., 0., 0.], [0., 0., 1., 0.], [0., -1., 0., 0.], [0., 0., 0., 1.]])
+        gltf["nodes"].append({"name": "configuration", "children": instance_nodes,
+                              "matrix": rotation.T.ravel().tolist()})
+        gltf["scenes"] = [{"nodes": [len(gltf["nodes"]) - 1]}]
+    else:
+        gltf["scenes"] = [{"nodes": instance_nodes}]
+    gltf["scene"] = 0
+    gltf["buffers"].append({"byteLength": offset})
+
+    json_chunk = _padded(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+    bin_chunk = _padded(b"".join(binary), b"\0")
+    with open(filename, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        f.write(json_chunk)
+        f.write(struct.pack("<I4s", len(bin_chunk), b"BIN\0"))
+        f.write(bin_chunk)
+
+
+# a triangle of a binary STL file
+_stl_triangle = np.dtype([("normal", "<f4", (3,)), ("corners", "<f4", (3, 3)), ("attributes", "<u2")])
+
+
+def write_stl(instances, filename):
+    """
+    writes the meshes into a binary STL file. As STL does not support instancing, the instances are transformed
+    """
+    records = []
+    for mesh, matrices in instances:
+        for matrix in matrices:
+            matrix = np.asarray(matrix, dtype=float)
+            vertices = mesh.vertices.dot(matrix[:3, :3].T) + matrix[:3, 3]
+            triangles = mesh.triangles
+            if np.linalg.det(matrix[:3, :3]) < 0:
+                # a mirror transformation reverses the orientation of the triangles
+                triangles = triangles[:, ::-1]
+            corners = vertices[triangles]
+            normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            lengths = np.linalg.norm(normals, axis=1)
+            lengths[lengths == 0] = 1.
+
+            record = np.zeros(len(triangles), dtype=_stl_triangle)
+            record["normal"] = normals / lengths[:, None]
+            record["corners"] = corners
+            records.append(record)
+
+    records = np.concatenate(records) if records else np.zeros(0, dtype=_stl_triangle)
+    with open(filename, "wb") as f:
+        f.write(b"binary STL written by tigl-examples mesh_export".ljust(80, b" "))
+        f.write(struct.pack("<I", len(records)))
+        f.write(records.tobytes())
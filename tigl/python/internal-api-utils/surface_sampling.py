@@ -0,0 +1,200 @@
+"""
+Evaluates surfaces, e.g. those created by tigl3.surface_factories, at many (u, v) parameters at once. Instead of one
+OCC call per point, B-spline surfaces are evaluated with numpy from their poles and knots:
+
+    samples = sample_grid(tigl3.surface_factories.interpolate_curves(profiles), 200, 100, derivatives=True)
+    samples.points    # array of shape (200 * 100, 3)
+    samples.normals   # array of shape (200 * 100, 3)
+    samples.du        # array of shape (200 * 100, 3)
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from OCC.gp import gp_Pnt, gp_Vec
+
+# the evaluated positions, normals and (optionally) first derivatives, each as array of shape (n, 3)
+SurfaceSamples = namedtuple("SurfaceSamples", ["u", "v", "points", "normals", "du", "dv"])
+
+
+def _object(handle):
+    return handle.GetObject() if hasattr(handle, "GetObject") else handle
+
+
+def basis_functions(knots, degree, n_poles, t):
+    """
+    evaluates the non-zero B-spline basis functions and their first derivatives at several parameters
+    :param knots: the knot vector, including repeated knots
+    :param t: array of parameters
+    :return: the index of the first non-zero basis function (n,), the basis functions (n, degree + 1) and their
+             derivatives (n, degree + 1)
+    """
+    p = degree
+    t = np.asarray(t, dtype=float)
+    span = np.clip(np.searchsorted(knots, t, side="right") - 1, p, n_poles - 1)
+
+    # the upper triangle of ndu contains the basis functions of increasing degree, the lower triangle the knot
+    # differences, see "The NURBS Book", algorithms A2.2 and A2.3
+    ndu = np.zeros((len(t), p + 1, p + 1))
+    ndu[:, 0, 0] = 1.
+    left = np.zeros((len(t), p + 1))
+    right = np.zeros((len(t), p + 1))
+    for j in range(1, p + 1):
+        left[:, j] = t - knots[span + 1 - j]
+        right[:, j] = knots[span + j] - t
+        saved = 0.
+        for r in range(j):
+            ndu[:, j, r] = right[:, r + 1] + left[:, j - r]
+            temp = ndu[:, r, j - 1] / ndu[:, j, r]
+            ndu[:, r, j] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        ndu[:, j, j] = saved
+
+    values = ndu[:, :p + 1, p].copy()
+    derivatives = np.zeros_like(values)
+    if p > 0:
+        for r in range(p + 1):
+            if r >= 1:
+                derivatives[:, r] += ndu[:, r - 1, p - 1] / ndu[:, p, r - 1]
+            if r <= p - 1:
+                derivatives[:, r] -= ndu[:, r, p - 1] / ndu[:, p, r]
+        derivatives *= p
+    return span - p, values, derivatives
+
+
+class SurfaceSampler(object):
+    """
+    Evaluates a surface at arrays of parameters. Non-periodic B-spline surfaces, as created by the surface factories,
+    are evaluated with numpy. All other surfaces are evaluated point by point using OCC.
+    """
+
+    def __init__(self, surface):
+        """
+        :param surface: a handle to a Geom_Surface, e.g. the result of tigl3.surface_factories.interpolate_curves
+        """
+        self.surface = _object(surface)
+        self.bounds = self.surface.Bounds()
+        self.is_bspline = hasattr(self.surface, "NbUPoles") and not self.surface.IsUPeriodic() \
+            and not self.surface.IsVPeriodic()
+        if self.is_bspline:
+            self._read_bspline()
+
+    def _read_bspline(self):
+        s = self.surface
+        nu, nv = s.NbUPoles(), s.NbVPoles()
+        # homogeneous coordinates (w * x, w * y, w * z, w) of the poles
+        self.poles = np.empty((nu, nv, 4))
+        for i in range(nu):
+            for j in range(nv):
+                p = s.Pole(i + 1, j + 1)
+                w = s.Weight(i + 1, j + 1)
+                self.poles[i, j] = w * p.X(), w * p.Y(), w * p.Z(), w
+        self.udegree = s.UDegree()
+        self.vdegree = s.VDegree()
+        self.uknots = np.repeat([s.UKnot(i) for i in range(1, s.NbUKnots() + 1)],
+                                [s.UMultiplicity(i) for i in range(1, s.NbUKnots() + 1)])
+        self.vknots = np.repeat([s.VKnot(i) for i in range(1, s.NbVKnots() + 1)],
+                                [s.VMultiplicity(i) for i in range(1, s.NbVKnots() + 1)])
+
+    def _evaluate_bspline(self, u, v):
+        nu, nv = self.poles.shape[:2]
+        iu, bu, dbu = basis_functions(self.uknots, self.udegree, nu, u)
+        iv, bv, dbv = basis_functions(self.vknots, self.vdegree, nv, v)
+
+        # the poles influencing each point, shape (n, udegree + 1, vdegree + 1, 4)
+        rows = iu[:, None] + np.arange(self.udegree + 1)
+        cols = iv[:, None] + np.arange(self.vdegree + 1)
+        local = self.poles[rows[:, :, None], cols[:, None, :]]
+
+        s = np.einsum("na,nabk,nb->nk", bu, local, bv)
+        su = np.einsum("na,nabk,nb->nk", dbu, local, bv)
+        sv = np.einsum("na,nabk,nb->nk", bu, local, dbv)
+
+        w = s[:, 3:]
+        points = s[:, :3] / w
+        du = (su[:, :3] - su[:, 3:] * points) / w
+        dv = (sv[:, :3] - sv[:, 3:] * points) / w
+        return points, du, dv
+
+    def _evaluate_occ(self, u, v):
+        points = np.empty((len(u), 3))
+        du = np.empty((len(u), 3))
+        dv = np.empty((len(u), 3))
+        p, d1u, d1v = gp_Pnt(), gp_Vec(), gp_Vec()
+        for i in range(len(u)):
+            self.surface.D1(float(u[i]), float(v[i]), p, d1u, d1v)
+            points[i] = p.X(), p.Y(), p.Z()
+            du[i] = d1u.X(), d1u.Y(), d1u.Z()
+            dv[i] = d1v.X(), d1v.Y(), d1v.Z()
+        return points, du, dv
+
+    def _evaluate(self, u, v):
+        return self._evaluate_bspline(u, v) if self.is_bspline else self._evaluate_occ(u, v)
+
+    def evaluate(self, u, v, derivatives=False, n_threads=1, chunk_size=65536):
+        """
+        evaluates the surface at pairs of parameters
+        :param u: array of u parameters
+        :param v: array of v parameters, of the same length as u
+        :param derivatives: if True, the first derivatives are returned as well
+        :param n_threads: the number of threads evaluating the chunks. The OCC evaluation always uses one thread
+        :param chunk_size: the number of points evaluated at once, which limits the temporary memory
+        :return: a SurfaceSamples with contiguous float64 arrays of shape (n, 3)
+        """
+        u = np.ascontiguousarray(u, dtype=float).ravel()
+        v = np.ascontiguousarray(v, dtype=float).ravel()
+        if u.shape != v.shape:
+            raise ValueError("u and v must have the same length")
+
+        n = len(u)
+        points, du, dv = np.empty((n, 3)), np.empty((n, 3)), np.empty((n, 3))
+
+        def evaluate_chunk(start):
+            end = min(start + chunk_size, n)
+            points[start:end], du[start:end], dv[start:end] = self._evaluate(u[start:end], v[start:end])
+
+        starts = range(0, n, chunk_size)
+        if n_threads > 1 and self.is_bspline and len(starts) > 1:
+            # numpy releases the GIL, hence the chunks are evaluated in parallel
+            with ThreadPoolExecutor(n_threads) as executor:
+                list(executor.map(evaluate_chunk, starts))
+        else:
+            for start in starts:
+                evaluate_chunk(start)
+
+        normals = np.cross(du, dv)
+        length = np.linalg.norm(normals, axis=1)
+        # the normal is undefined at degenerated points, e.g. at a collapsed wing tip
+        valid = length > 0
+        normals[valid] /= length[valid, None]
+
+        if not derivatives:
+            du = dv = None
+        return SurfaceSamples(u, v, points, normals, du, dv)
+
+    def grid(self, n_u, n_v, **kwargs):
+        """
+        evaluates the surface on an equidistant grid in the parameter domain
+        :param n_u: the number of points in u direction
+        :param n_v: the number of points in v direction
+        :return: a SurfaceSamples, the point (i, j) of the grid has the index i * n_v + j
+        """
+        u1, u2, v1, v2 = self.bounds
+        u, v = np.meshgrid(np.linspace(u1, u2, n_u), np.linspace(v1, v2, n_v), indexing="ij")
+        return self.evaluate(u, v, **kwargs)
+
+
+def sample_surface(surface, u, v, derivatives=False, n_threads=1):
+    """
+    evaluates a surface at pairs of parameters, see SurfaceSampler.evaluate
+    """
+    return SurfaceSampler(surface).evaluate(u, v, derivatives=derivatives, n_threads=n_threads)
+
+
+def sample_grid(surface, n_u, n_v, derivatives=False, n_threads=1):
+    """
+    evaluates a surface on an equidistant grid in the parameter domain, see SurfaceSampler.grid
+    """
+    return SurfaceSampler(surface).grid(n_u, n_v, derivatives=derivatives, n_threads=n_threads)